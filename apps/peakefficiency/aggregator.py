@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+import bisect
+
+
+DEFAULT_THRESHOLD = 0.0  # degree-hours are counted below this temperature
+DEFAULT_PERCENTILES = (10, 50, 90)
+THRESHOLD_VARIABLE = "temperature_2m"
+
+
+@dataclass(frozen=True)
+class SummaryWindow:
+    """
+    Hours of the local day to summarize, inclusive; wraps past midnight when
+    start_hour > end_hour (e.g. 20 -> 8).
+    """
+    name: str
+    start_hour: int
+    end_hour: int
+
+    def contains(self, hour):
+        if self.start_hour <= self.end_hour:
+            return self.start_hour <= hour <= self.end_hour
+        return hour >= self.start_hour or hour <= self.end_hour
+
+
+DEFAULT_WINDOWS = (
+    SummaryWindow("overnight", 20, 8),
+    SummaryWindow("solar_noon", 11, 14),
+)
+
+
+def parse_windows(config):
+    """
+    Windows from app args, e.g. {"overnight": [20, 8], "afternoon": "13-17"}.
+    """
+    windows = []
+    for name, hours in config.items():
+        start, end = hours.split("-") if isinstance(hours, str) else hours
+        windows.append(SummaryWindow(name, int(start), int(end)))
+    return tuple(windows)
+
+
+class RunningStats:
+    """
+    Order statistics for one variable in one window. Values are kept sorted, so min,
+    max and percentiles are lookups and a value can be taken back out when the hour it
+    belongs to is re-forecast or has passed.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold
+        self.count = 0
+        self.total = 0.0
+        self.below = 0.0  # degree-hours under threshold
+        self.hours_below = 0
+        self._sorted = []  # (value, epoch)
+
+    def add(self, value, epoch):
+        bisect.insort(self._sorted, (value, epoch))
+        self._tally(value, 1)
+
+    def remove(self, value, epoch):
+        i = bisect.bisect_left(self._sorted, (value, epoch))
+        if i < len(self._sorted) and self._sorted[i] == (value, epoch):
+            del self._sorted[i]
+            self._tally(value, -1)
+
+    def _tally(self, value, sign):
+        self.count += sign
+        self.total += sign * value
+        if self.threshold is not None and value < self.threshold:
+            self.below += sign * (self.threshold - value)
+            self.hours_below += sign
+
+    def percentile(self, pct):
+        index = max(0, min(self.count - 1, round(pct / 100 * self.count) - 1))
+        return self._sorted[index][0]
+
+    def snapshot(self, percentiles=DEFAULT_PERCENTILES):
+        if not self.count:
+            return {"count": 0}
+        stats = {
+            "count": self.count,
+            "min": self._sorted[0][0],
+            "min_at": self._sorted[0][1],
+            "max": self._sorted[-1][0],
+            "max_at": self._sorted[-1][1],
+            "mean": self.total / self.count,
+            **{f"p{pct}": self.percentile(pct) for pct in percentiles},
+        }
+        if self.threshold is not None:
+            stats["degree_hours_below"] = self.below
+            stats["hours_below"] = self.hours_below
+        return stats
+
+
+class ForecastAggregator:
+    """
+    Summaries of any number of named windows, built in one pass over the forecast and
+    kept up to date as new forecasts arrive.
+    Notes:
+        - Each local hour maps to the windows containing it, so a row costs one lookup
+          plus an insert per window it falls in.
+        - update() only touches rows whose values changed since the last update, and
+          drop_before() takes passed hours back out, so a long-lived aggregator follows
+          the rolling forecast without re-reading it.
+    """
+
+    def __init__(self, variables, windows=DEFAULT_WINDOWS, threshold=DEFAULT_THRESHOLD, percentiles=DEFAULT_PERCENTILES):
+        self.variables = tuple(variables)
+        self.windows = {w.name: w for w in windows}
+        self.percentiles = tuple(percentiles)
+        self.stats = {
+            w.name: {v: RunningStats(threshold if v == THRESHOLD_VARIABLE else None) for v in self.variables}
+            for w in windows
+        }
+        self._by_hour = [[w.name for w in windows if w.contains(h)] for h in range(24)]
+        self._rows = {}  # epoch -> (local hour, values)
+
+    def update(self, series):
+        """
+        Merge every row of a ForecastSeries. Returns the number of rows added or changed.
+        """
+        columns = [series.column(v) for v in self.variables]
+        changed = 0
+        for i, epoch in enumerate(series.times):
+            values = tuple(c[i] for c in columns)
+            previous = self._rows.get(epoch)
+            if previous is not None:
+                if _same(previous[1], values):
+                    continue
+                self._apply(epoch, *previous, remove=True)
+            hour = series.local_hours[i]
+            self._rows[epoch] = (hour, values)
+            self._apply(epoch, hour, values)
+            changed += 1
+        return changed
+
+    def drop_before(self, epoch):
+        for t in [t for t in self._rows if t < epoch]:
+            self._apply(t, *self._rows.pop(t), remove=True)
+
+    def summary(self, name):
+        """
+        {variable: stats} for one window; see RunningStats.snapshot.
+        """
+        return {v: s.snapshot(self.percentiles) for v, s in self.stats[name].items()}
+
+    def summaries(self):
+        return {name: self.summary(name) for name in self.stats}
+
+    def _apply(self, epoch, hour, values, remove=False):
+        for name in self._by_hour[hour]:
+            window = self.stats[name]
+            for variable, value in zip(self.variables, values):
+                if value != value:
+                    continue
+                if remove:
+                    window[variable].remove(value, epoch)
+                else:
+                    window[variable].add(value, epoch)
+
+
+def _same(a, b):
+    return all(x == y or (x != x and y != y) for x, y in zip(a, b))
@@ -0,0 +1,176 @@
+"""
+Replay a season of stored forecasts against what was actually observed and compare soak
+scheduling strategies by the electricity a heat pump would have used.
+
+Both inputs are Open-Meteo archive-format JSON files (as returned by the archive or
+historical-forecast APIs with timezone=auto): the forecast the app would have seen, and
+the observed hourly temperatures.
+
+    python backtest.py forecast.json observed.json [--workers N]
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime, time, timedelta
+import argparse
+import json
+import math
+
+from optimizer import WindowOptimizer, SCORES, cop_score, prefix_sums, DEFAULT_STEP_MINUTES
+from registry import DEFAULT_ZONES
+from scheduler import pack_zones, makespan, DAILY_SCHEDULE_SOAK_RUN, DEFAULT_RUN_AT_TIME
+from series import ForecastSeries
+
+
+ARCHIVE_VARIABLES = ("temperature_2m", "relative_humidity_2m", "shortwave_radiation")
+DEFAULT_ZONE_HEAT_KW = 1.0  # heat delivered per zone while soaking
+#the app's zone durations in seconds
+DEFAULT_DURATIONS = {climate: options["duration"] * 60 for climate, options in DEFAULT_ZONES.items()}
+DURATION_SCALES = (0.5, 0.75, 1.5)  # soak lengths swept by default_strategies, relative to DEFAULT_DURATIONS
+
+
+@dataclass
+class Strategy:
+    name: str
+    score: str = "temperature"  # key in optimizer.SCORES; ignored when fixed_time is set
+    fixed_time: time = None  # always start at this time instead of searching the forecast
+    durations: dict = field(default_factory=lambda: dict(DEFAULT_DURATIONS))
+    max_concurrent: int = 1
+    longest_first: bool = True
+    finish_by: time = None
+
+
+@dataclass
+class BacktestResult:
+    strategy: str
+    days: int
+    fallback_days: int  # days the forecast had no window and DEFAULT_RUN_AT_TIME was used
+    electric_kwh: float
+    heat_kwh: float
+    daily_start: list  # (date, start datetime) per day
+
+    @property
+    def mean_cop(self):
+        return self.heat_kwh / self.electric_kwh if self.electric_kwh else math.nan
+
+
+def load_archive(path, variables=ARCHIVE_VARIABLES):
+    with open(path, "r") as f:
+        data = json.load(f)
+    present = tuple(v for v in variables if v in data["hourly"])
+    return ForecastSeries.from_open_meteo(data, present)
+
+
+def run_backtest(forecast, observed, strategy, step_minutes=DEFAULT_STEP_MINUTES,
+                 plan_at=DAILY_SCHEDULE_SOAK_RUN, zone_heat_kw=DEFAULT_ZONE_HEAT_KW):
+    """
+    Run the app's daily decision for every day in the forecast and cost the resulting
+    soak against the observed temperatures.
+    Notes:
+        - Each day is planned at plan_at with the same rules as schedule_energy_soak_run:
+          the best window starting later that day, else DEFAULT_RUN_AT_TIME.
+        - Window means and the observed 1/COP prefix sums are computed once for the whole
+          season, so each day costs a slice scan plus O(1) per zone.
+    """
+    optimizer = WindowOptimizer(forecast, step_minutes)
+    fc = optimizer.series
+    slots = pack_zones(strategy.durations, strategy.max_concurrent, longest_first=strategy.longest_first)
+    minutes = makespan(slots) / 60
+    step = step_minutes * 60
+
+    size, means = None, None
+    if strategy.fixed_time is None:
+        size, means = optimizer.window_means(minutes, SCORES[strategy.score])
+
+    #electricity per kWh of heat for every observed sample, as prefix sums over the season
+    obs = observed.resample(step_minutes)
+    cop = cop_score()(obs)
+    inverse_cop = prefix_sums(array("d", (1 / c if c == c and c > 0 else 0.0 for c in cop)))
+    missing = prefix_sums(array("d", (c != c for c in cop)))
+
+    def electric(start_epoch, seconds):
+        i = round((start_epoch - obs.times[0]) / step)
+        j = i + round(seconds / step)
+        if i < 0 or j >= len(inverse_cop) or missing[j] != missing[i]:
+            return None
+        return zone_heat_kw * (step / 3600) * (inverse_cop[j] - inverse_cop[i])
+
+    result = BacktestResult(strategy=strategy.name, days=0, fallback_days=0, electric_kwh=0.0, heat_kwh=0.0, daily_start=[])
+    first_day = fc.to_local_datetime(fc.times[0]).date()
+    last_day = fc.to_local_datetime(fc.times[-1]).date()
+
+    day = first_day
+    while day <= last_day:
+        start = _plan_day(optimizer, day, strategy, size, means, plan_at)
+        if start is None:
+            start = datetime.combine(day, DEFAULT_RUN_AT_TIME)
+            result.fallback_days += 1
+        start_epoch = fc.local_epoch(start)
+
+        costs = [electric(start_epoch + s.offset, s.duration) for s in slots]
+        if None not in costs:
+            result.days += 1
+            result.electric_kwh += sum(costs)
+            result.heat_kwh += zone_heat_kw * sum(s.duration for s in slots) / 3600
+            result.daily_start.append((day, start))
+        day += timedelta(days=1)
+
+    return result
+
+
+def _plan_day(optimizer, day, strategy, size, means, plan_at):
+    if strategy.fixed_time is not None:
+        return datetime.combine(day, strategy.fixed_time)
+
+    finish_by = datetime.combine(day, strategy.finish_by) if strategy.finish_by is not None else None
+    windows = optimizer.best_of(size, means, now=datetime.combine(day, plan_at), today_only=True, finish_by=finish_by)
+    return windows[0].start if windows else None
+
+
+def _run_file_backtest(forecast_path, observed_path, strategy):
+    return run_backtest(load_archive(forecast_path), load_archive(observed_path), strategy)
+
+
+def sweep(forecast_path, observed_path, strategies, workers=None):
+    """
+    Backtest every strategy on a process pool; each worker loads the archives itself.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_file_backtest, forecast_path, observed_path, s) for s in strategies]
+        return [f.result() for f in futures]
+
+
+def default_strategies():
+    base = Strategy(name="forecast temperature")
+    strategies = [
+        Strategy(name="fixed 12:00", fixed_time=time(12)),
+        Strategy(name="fixed 15:00", fixed_time=DEFAULT_RUN_AT_TIME),
+        base,
+        replace(base, name="forecast cop", score="cop"),
+        replace(base, name="forecast radiation", score="radiation"),
+        replace(base, name="forecast temperature, configured order", longest_first=False),
+        replace(base, name="forecast temperature, finish by 17:00", finish_by=time(17)),
+    ]
+    for concurrent in (2, 3):
+        strategies.append(replace(base, name=f"forecast temperature, {concurrent} concurrent", max_concurrent=concurrent))
+        strategies.append(replace(base, name=f"forecast cop, {concurrent} concurrent", score="cop", max_concurrent=concurrent))
+    for scale in DURATION_SCALES:
+        durations = {climate: round(seconds * scale / 60) * 60 for climate, seconds in DEFAULT_DURATIONS.items()}
+        strategies.append(replace(base, name=f"forecast temperature, durations x{scale:g}", durations=durations))
+    return strategies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("forecast")
+    parser.add_argument("observed")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    results = sweep(args.forecast, args.observed, default_strategies(), args.workers)
+    baseline = next(r for r in results if r.strategy == "fixed 15:00")
+    for r in sorted(results, key=lambda r: r.electric_kwh / max(r.days, 1)):
+        saving = 1 - (r.electric_kwh / max(r.days, 1)) / (baseline.electric_kwh / max(baseline.days, 1))
+        #duration variants deliver a different amount of heat, so compare them by COP as well
+        print(f"{r.strategy:<44} days={r.days:<4} fallback={r.fallback_days:<4} heat/day={r.heat_kwh / max(r.days, 1):6.3f}  "
+              f"kWh/day={r.electric_kwh / max(r.days, 1):6.3f}  COP={r.mean_cop:5.2f}  vs 15:00 {saving:+6.1%}")
@@ -0,0 +1,154 @@
+from array import array
+import math
+
+from series import ForecastSeries
+
+
+DEFAULT_DRIFT_THRESHOLD = 1.5  # C the error trend must move later hours by since the last plan to re-plan
+DEFAULT_BIAS_HALF_LIFE = 60 * 60  # seconds after which a sensor reading counts half as much
+DEFAULT_TREND_HORIZON = 3 * 60 * 60  # seconds ahead over which the error trend is extrapolated
+DEFAULT_MIN_TREND_SPAN = 30 * 60  # weighted spread in time the readings need before a trend is fitted
+DEFAULT_MIN_SAMPLES = 3  # sensor readings needed before the bias is trusted
+DEFAULT_REPLAN_COOLDOWN = 30 * 60  # seconds between drift re-plans
+TEMPERATURE = "temperature_2m"
+
+
+class BiasEstimator:
+    """
+    Exponentially weighted least-squares line through sensor minus forecast over time,
+    weighted by time rather than by sample so a chatty sensor counts no more than a quiet
+    one. O(1) per reading.
+    Notes:
+        - Times are hours relative to the latest reading, so the line's intercept is the
+          bias now and its slope how fast the bias is changing.
+        - With too little spread in time (a burst of readings) the slope is left at 0.
+    """
+
+    def __init__(self, half_life=DEFAULT_BIAS_HALF_LIFE, min_span=DEFAULT_MIN_TREND_SPAN):
+        self.half_life = half_life
+        self.min_span = min_span
+        self.reset()
+
+    def reset(self):
+        self.bias = 0.0
+        self.trend = 0.0  # C per hour
+        self.samples = 0
+        self.last_epoch = None
+        self._w = self._x = self._y = self._xx = self._xy = 0.0
+
+    def update(self, epoch, residual):
+        if self.last_epoch is None:
+            weight = 1.0
+        else:
+            elapsed = max(0.0, epoch - self.last_epoch)
+            decay = 0.5 ** (elapsed / self.half_life)
+            weight = 1 - decay
+            #move the origin to this reading, then age the older ones
+            d = elapsed / 3600
+            self._xx = decay * (self._xx - 2 * d * self._x + d * d * self._w)
+            self._xy = decay * (self._xy - d * self._y)
+            self._x = decay * (self._x - d * self._w)
+            self._y *= decay
+            self._w *= decay
+        self._w += weight
+        self._y += weight * residual
+        self.samples += 1
+        self.last_epoch = epoch
+
+        mean_x, mean_y = self._x / self._w, self._y / self._w
+        spread = self._xx / self._w - mean_x * mean_x
+        if spread < (self.min_span / 3600) ** 2:
+            self.trend = 0.0
+        else:
+            self.trend = (self._xy / self._w - mean_x * mean_y) / spread
+        self.bias = mean_y - self.trend * mean_x
+        return self.bias
+
+
+class DriftMonitor:
+    """
+    Tracks how the live outdoor sensor departs from the forecast, and corrects the
+    forecast for it.
+    Notes:
+        - A uniform offset says how warm the day is, not which hours are warmest, so it
+          never moves a window: correct() applies only the trend, and a re-plan is due
+          only once the trend has moved later hours by threshold since planned() was
+          last called, at most once per cooldown.
+        - The trend is extrapolated as trend * horizon * (1 - exp(-lead / horizon)),
+          linear near term and never more than trend * horizon.
+        - correction() adds the bias to that, for estimates of the temperature itself.
+    """
+
+    def __init__(self, threshold=DEFAULT_DRIFT_THRESHOLD, half_life=DEFAULT_BIAS_HALF_LIFE, horizon=DEFAULT_TREND_HORIZON,
+                 min_samples=DEFAULT_MIN_SAMPLES, cooldown=DEFAULT_REPLAN_COOLDOWN, min_span=DEFAULT_MIN_TREND_SPAN):
+        self.threshold = threshold
+        self.horizon = horizon
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.estimator = BiasEstimator(half_life, min_span)
+        self.planned_trend = 0.0
+        self.planned_at = None
+
+    @property
+    def bias(self):
+        return self.estimator.bias if self.estimator.samples >= self.min_samples else 0.0
+
+    @property
+    def trend(self):
+        """
+        C per hour the bias is changing by.
+        """
+        return self.estimator.trend if self.estimator.samples >= self.min_samples else 0.0
+
+    @property
+    def drift(self):
+        """
+        C the trend has moved the far end of the horizon by since the last plan.
+        """
+        return (self.trend - self.planned_trend) * self.horizon / 3600
+
+    def observe(self, epoch, observed, series):
+        """
+        Fold in one sensor reading against the forecast. Returns True when a re-plan is due.
+        """
+        if series is None or observed is None:
+            return False
+        forecast = series.value_at(TEMPERATURE, epoch)
+        if forecast != forecast:
+            return False
+        self.estimator.update(epoch, observed - forecast)
+        return self.due(epoch)
+
+    def due(self, epoch):
+        if self.estimator.samples < self.min_samples or abs(self.drift) < self.threshold:
+            return False
+        return self.planned_at is None or epoch - self.planned_at >= self.cooldown
+
+    def planned(self, epoch):
+        """
+        Record that a plan was made with the current trend correction.
+        """
+        self.planned_trend = self.trend
+        self.planned_at = epoch
+
+    def shift(self, lead):
+        """
+        C the trend adds to the forecast for `lead` seconds from now.
+        """
+        return self.trend * self.horizon / 3600 * (1 - math.exp(-max(0.0, lead) / self.horizon))
+
+    def correction(self, lead):
+        """
+        C to add to the forecast temperature for `lead` seconds from now.
+        """
+        return self.bias + self.shift(lead)
+
+    def correct(self, series, now):
+        """
+        The series with the trend applied to its temperatures, for ranking windows, or
+        the series itself while there is no trend.
+        """
+        if series is None or not self.trend:
+            return series
+        temps = array("d", (v + self.shift(t - now) for t, v in zip(series.times, series.column(TEMPERATURE))))
+        return ForecastSeries(series.times, series.utc_offset, {**series.columns, TEMPERATURE: temps})
@@ -1,160 +1,496 @@
-from datetime import datetime, timezone
-import requests
-import math
-import statistics
-import json
-
-class ForecastSummary:
-    def __init__(self, app, lat, lon):
-        self.app = app
-        self.lat = lat
-        self.lon = lon
-        self.forecast_data = self._get_hourly_forecast(lat, lon, hours=48)
-        
-    def get_forecast_data(self, start_time=None, end_time=None):
-        """
-        Returns the forecast data.
-        """
-               
-        return self.forecast_data
-        
-    def _get_hourly_forecast(self, lat, lon, hours=6):
-        
-        #calculate forecast days based on hours
-        forecast_days = math.ceil(hours / 24)
-        
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "hourly": "temperature_2m,relative_humidity_2m,shortwave_radiation",
-            "forecast_days": forecast_days,
-            "timezone": "auto"
-        }
-
-        try:
-            # Check if the API is reachable
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()            
-        except requests.exceptions.RequestException as e:
-            self.error(f"Error fetching forecast data: {e}")
-            return []
-        except json.JSONDecodeError as e:
-            self.error(f"Error decoding JSON response: {e}")
-            return []
-        except Exception as e:
-            self.error(f"Unexpected error: {e}")
-            return []
-        
-        # Check if the response contains the expected data
-        if "hourly" not in data or not data["hourly"]:
-            self.error("Invalid response structure from Open-Meteo API.")
-            return []
-        
-        times = data["hourly"]["time"]
-        temps = data["hourly"]["temperature_2m"]
-        humidity = data["hourly"]["relative_humidity_2m"]
-        radiation = data["hourly"]["shortwave_radiation"]
-
-        # Return a list of tuples for unpacking
-        return list(zip(times, temps, humidity, radiation))[:hours]  
-    
-    
-    def warmest_hours(self, minutes):
-        """
-        within a given forecast, ensuring the period is within the current day and 
-        starts after the current time (not in the past).
-            - The identified period must start after the current time and end within 
-              the current day.
-        Args:
-            forecast (list of tuples): A list of forecast data where each tuple contains 
-                (time, temperature, humidity, radiation). Only the time and temperature 
-                are used in this function.
-            minutes (int): The duration in minutes for which the warmest period is to 
-                be calculated. This value is rounded up to the nearest full hour.
-        Returns:
-            tuple: A tuple containing:
-                - best_start_time (datetime): The starting time of the warmest period.
-                - block_size (int): The number of hours in the warmest period.
-        Raises:
-            ValueError: If the forecast data is shorter than the required window size.
-        Notes:
-            - The function calculates the sum of temperatures for consecutive hours 
-              and identifies the period with the highest sum.
-            - The forecast data must be in ISO 8601 format for the time values.
-        """
-        forecast = self.forecast_data
-        block_size = math.ceil(minutes / 60 )  # round up to full hours
-        if len(forecast) < block_size:
-            raise ValueError("Forecast data too short for the requested window")
-
-        max_sum = float('-inf')
-        best_start_time = None
-
-        # forecast is list of tuples: (time, temp, humidity, radiation)
-        # we only need the first two elements of each tuple
-        forecast_temp = [(datetime.fromisoformat(t), temp) for t, temp, _, _ in forecast]
-        for i in range(len(forecast) - block_size + 1):
-            window = forecast_temp[i:i + block_size]
-            temp_sum = sum(temp for _, temp in window)
-
-            #only look at today's forecast
-            if window[0][0].date() != datetime.now().date():
-                continue
-
-            if temp_sum > max_sum:
-                max_sum = temp_sum
-                best_start_time = window[0][0]  # timestamp of the first hour
-
-        #if the best time is in the past then return None
-        if best_start_time is not None and best_start_time < datetime.now():
-            self.app.log(f"Best start time is {best_start_time}, which has passed")
-            return None, block_size
-
-        return best_start_time, block_size          
-
-    def _filter_overnight_hours(self, data):
-        """
-        Filter for hours between sunset and wake-up (e.g. 8pm to 8am).
-        Adjust as needed.
-        """
-        overnight = []
-        for t, temp, rh, rad in data:
-            hour = datetime.fromisoformat(t).hour
-            if hour >= 20 or hour <= 8: # 8 PM to 8 AM
-                overnight.append((t, temp, rh, rad))
-        return overnight
-
-    def summarize(self):
-        overnight = self._filter_overnight_hours(self.forecast_data)
-
-        if not overnight:
-            self.app.log("No overnight data available for summary.")
-            return {}
-
-        temps = [temp for _, temp, _, _ in overnight]
-        humidities = [rh for _, _, rh, _ in overnight]
-        radiation = [rad for _, _, _, rad in overnight]
-
-        min_temp = min(temps)
-        avg_temp = statistics.mean(temps)
-        avg_humidity = statistics.mean(humidities)
-        avg_radiation = statistics.mean(radiation)
-
-        duration_below_zero = sum(1 for t in temps if t < 0)
-
-        # Find time of min temperature
-        min_temp_index = temps.index(min_temp)
-        min_temp_time = overnight[min_temp_index][0]
-        min_temp_hour = datetime.fromisoformat(min_temp_time).hour
-
-        return {
-            "min_forecast_temp_overnight": min_temp,
-            "avg_forecast_temp_overnight": avg_temp,
-            "avg_humidity_overnight": avg_humidity,
-            "avg_radiation_overnight": avg_radiation,
-            "duration_below_zero": duration_below_zero,
-            "hour_of_min_temp": min_temp_hour
-        }
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import math
+import json
+import os
+import threading
+import time
+from series import ForecastSeries, ForecastBuffer
+from aggregator import ForecastAggregator
+from optimizer import WindowOptimizer, temperature_score, DEFAULT_STEP_MINUTES
+from metrics import NULL_METRICS, timed_method
+
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+HOURLY_VARIABLES = ("temperature_2m", "relative_humidity_2m", "shortwave_radiation")
+DEFAULT_FORECAST_HOURS = 48
+DEFAULT_CACHE_TTL = 60 * 60  # seconds a cached forecast is served without going to the network
+DEFAULT_CACHE_MAX_AGE = 24 * 60 * 60  # seconds before a cached forecast is evicted
+DEFAULT_CACHE_MAX_ENTRIES = 32
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "forecast_cache.json")
+DEFAULT_REFRESH_HOURS = 24  # hours ahead re-fetched on a routine refresh
+DEFAULT_REFRESH_SLACK = 12  # fetch the full horizon once the buffer falls this many hours short of it
+DEFAULT_FETCH_WAIT = 5  # seconds to wait for a forecast when there is no cached one to fall back to
+DEFAULT_BATCH_DELAY = 0.25  # seconds a refresh waits for other sites to join the same request
+HTTP_TIMEOUT = (3.05, 10)  # (connect, read) seconds per attempt
+HTTP_RETRIES = 3
+HTTP_RETRY_BACKOFF = 0.5  # urllib3 sleeps backoff * 2^(retry - 1) seconds between attempts
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ForecastCache:
+    """
+    Forecast responses keyed by (lat, lon, variables, horizon), kept in memory and
+    mirrored to a JSON file so they survive AppDaemon restarts and app reloads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, max_age=DEFAULT_CACHE_MAX_AGE, max_entries=DEFAULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (fetched_at, payload)
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def make_key(lat, lon, variables, hours):
+        return f"{float(lat):.4f},{float(lon):.4f}|{','.join(variables)}|{hours}"
+
+    def get(self, key, ttl, now=None):
+        """
+        Return the cached payload for key if it is younger than ttl seconds, otherwise None.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+        if entry is None or now - entry[0] > ttl:
+            return None
+        return entry[1]
+
+    def put(self, key, payload, now=None):
+        self.put_many({key: payload}, now)
+
+    def put_many(self, payloads, now=None):
+        """
+        Store several payloads with a single write of the cache file.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._load()
+            for key, payload in payloads.items():
+                self._entries[key] = (now, payload)
+            self._evict(now)
+            self._save()
+
+    def _evict(self, now):
+        expired = [k for k, (fetched_at, _) in self._entries.items() if now - fetched_at > self.max_age]
+        for k in expired:
+            del self._entries[k]
+
+        if len(self._entries) > self.max_entries:
+            oldest_first = sorted(self._entries, key=lambda k: self._entries[k][0])
+            for k in oldest_first[:len(self._entries) - self.max_entries]:
+                del self._entries[k]
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f)
+            self._entries = {k: (v["fetched_at"], v["payload"]) for k, v in raw.items()}
+            self._evict(time.time())
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            #a corrupt or unreadable cache file only costs us a fetch
+            self._entries = {}
+
+    def _save(self):
+        if not self.path:
+            return
+        raw = {k: {"fetched_at": fetched_at, "payload": payload} for k, (fetched_at, payload) in self._entries.items()}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(raw, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+#caches and forecast services are shared by every app instance in this AppDaemon process
+_caches = {}
+_services = {}
+_caches_lock = threading.Lock()
+
+
+def get_forecast_cache(path=DEFAULT_CACHE_FILE):
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = ForecastCache(path)
+        return _caches[path]
+
+
+#one pooled keep-alive session and a small worker pool keep forecast I/O off the AppDaemon threads
+_session = None
+_executor = None
+_http_lock = threading.Lock()
+
+
+def get_http_session():
+    global _session
+    with _http_lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_RETRIES,
+                backoff_factor=HTTP_RETRY_BACKOFF,
+                status_forcelist=HTTP_RETRY_STATUSES,
+                allowed_methods=("GET",),
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _get_executor():
+    global _executor
+    with _http_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="peakefficiency_forecast")
+        return _executor
+
+
+class ForecastService:
+    """
+    Shared by every app in the process. Refreshes requested within batch_delay of each
+    other, plus any registered site whose cached forecast has expired, go out as one
+    Open-Meteo request with comma-separated coordinates; the response is split per site
+    and stored in the cache.
+    Notes:
+        - Each site keeps a ForecastBuffer. Fetches are incremental: a routine refresh asks
+          for the next refresh_hours only and merges them over the buffer, and the full
+          horizon is requested only once the buffer runs short of it.
+        - forecast_hours counts from each location's current hour, so sites in different
+          time zones still share one request.
+    """
+
+    def __init__(self, cache, url=OPEN_METEO_URL, batch_delay=DEFAULT_BATCH_DELAY,
+                 refresh_hours=DEFAULT_REFRESH_HOURS, refresh_slack=DEFAULT_REFRESH_SLACK):
+        self.cache = cache
+        self.url = url
+        self.batch_delay = batch_delay
+        self.refresh_hours = refresh_hours
+        self.refresh_slack = refresh_slack
+        self._lock = threading.Lock()
+        self._merge_lock = threading.Lock()
+        self._buffers = {}  # key -> ForecastBuffer
+        self._sites = {}  # key -> (lat, lon, hours, ttl) of every registered or requested site
+        self._registered = {}  # key -> number of apps that registered the site
+        self._pending = {}  # key -> Future resolved by the next batch
+        self._requesters = {}  # key -> (app, metrics) to report fetch errors and timings to
+        self._batch_scheduled = False
+
+    def register(self, lat, lon, hours=DEFAULT_FORECAST_HOURS, ttl=DEFAULT_CACHE_TTL):
+        """
+        Include a site in every batch from now on, so it is refreshed alongside the others.
+        """
+        key = ForecastCache.make_key(lat, lon, HOURLY_VARIABLES, hours)
+        with self._lock:
+            self._sites[key] = (lat, lon, hours, ttl)
+            self._registered[key] = self._registered.get(key, 0) + 1
+        return key
+
+    def unregister(self, key):
+        with self._lock:
+            count = self._registered.get(key, 0) - 1
+            if count > 0:
+                self._registered[key] = count
+            else:
+                self._registered.pop(key, None)
+
+    def buffer(self, key):
+        """
+        The site's rolling buffer, seeded from the cache file the first time it is used.
+        """
+        with self._merge_lock:
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = ForecastBuffer(HOURLY_VARIABLES)
+                cached = self.cache.get(key, self.cache.max_age)
+                if cached is not None:
+                    buffer.merge(cached)
+            return buffer
+
+    def history(self, key, epoch):
+        """
+        Every forecast fetched for the hour containing epoch, oldest first. See ForecastBuffer.history.
+        """
+        buffer = self.buffer(key)
+        with self._merge_lock:
+            return buffer.history(epoch)
+
+    def refresh(self, app, lat, lon, hours=DEFAULT_FORECAST_HOURS, ttl=DEFAULT_CACHE_TTL, metrics=NULL_METRICS):
+        """
+        Queue a site for the next batch. Returns a Future for its payload (None on failure);
+        callers asking for the same site before the batch goes out share the Future.
+        """
+        key = ForecastCache.make_key(lat, lon, HOURLY_VARIABLES, hours)
+        with self._lock:
+            self._sites.setdefault(key, (lat, lon, hours, ttl))
+            self._requesters[key] = (app, metrics)
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+            if not self._batch_scheduled:
+                self._batch_scheduled = True
+                _get_executor().submit(self._run_batch)
+        return future
+
+    def _run_batch(self):
+        time.sleep(self.batch_delay)
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            requesters, self._requesters = self._requesters, {}
+            self._batch_scheduled = False
+
+            #piggyback registered sites whose cached forecast has expired
+            for key in self._registered:
+                if key not in pending and self.cache.get(key, self._sites[key][3]) is None:
+                    pending[key] = None
+            sites = [self._sites[key] for key in pending]
+
+        payloads = {}
+        try:
+            now = time.time()
+            buffers = [self.buffer(key) for key in pending]
+            forecast_hours = max(
+                buffer.hours_needed(hours, self.refresh_hours, self.refresh_slack, now)
+                for buffer, (_, _, hours, _) in zip(buffers, sites)
+            )
+
+            start = time.perf_counter()
+            results = self._fetch(sites, {app for app, _ in requesters.values()}, forecast_hours)
+            for metrics in {id(m): m for _, m in requesters.values()}.values():
+                if metrics.enabled:
+                    metrics.record("forecast_fetch", time.perf_counter() - start)
+
+            with self._merge_lock:
+                for key, buffer, (_, _, hours, _), result in zip(pending, buffers, sites, results):
+                    if result is None:
+                        continue
+                    buffer.merge(result, now)
+                    buffer.drop_before(now)
+                    payloads[key] = buffer.to_payload(hours, now)
+            if payloads:
+                self.cache.put_many(payloads)
+        finally:
+            for key, future in pending.items():
+                if future is not None:
+                    future.set_result(payloads.get(key))
+
+    def _fetch(self, sites, apps, forecast_hours):
+        """
+        One request for the next forecast_hours at every site. Returns a payload (or None)
+        per site, in order.
+        """
+        params = {
+            "latitude": ",".join(str(lat) for lat, _, _, _ in sites),
+            "longitude": ",".join(str(lon) for _, lon, _, _ in sites),
+            "hourly": ",".join(HOURLY_VARIABLES),
+            "forecast_hours": forecast_hours,
+            "timezone": "auto"
+        }
+
+        def report(message):
+            for app in apps:
+                app.error(message)
+
+        try:
+            # Check if the API is reachable
+            response = get_http_session().get(self.url, params=params, timeout=HTTP_TIMEOUT)
+            response.raise_for_status()
+            
+            data = response.json()            
+        except requests.exceptions.RequestException as e:
+            report(f"Error fetching forecast data: {e}")
+            return [None] * len(sites)
+        except json.JSONDecodeError as e:
+            report(f"Error decoding JSON response: {e}")
+            return [None] * len(sites)
+        except Exception as e:
+            report(f"Unexpected error: {e}")
+            return [None] * len(sites)
+
+        #a single location comes back as an object, several as a list in request order
+        results = data if isinstance(data, list) else [data]
+        if len(results) != len(sites):
+            report(f"Open-Meteo returned {len(results)} forecasts for {len(sites)} locations.")
+            return [None] * len(sites)
+
+        payloads = []
+        for (lat, lon, _, _), result in zip(sites, results):
+            # Check if the response contains the expected data
+            if not isinstance(result, dict) or not result.get("hourly"):
+                report(f"Invalid response structure from Open-Meteo API for ({lat}, {lon}).")
+                result = None
+            payloads.append(result)
+
+        for app in apps:
+            app.log(f"Fetched {forecast_hours}h forecasts for {len(sites)} location(s) from Open-Meteo in one request", level="DEBUG")
+        return payloads
+
+
+def get_forecast_service(path=DEFAULT_CACHE_FILE, url=OPEN_METEO_URL):
+    cache = get_forecast_cache(path)
+    with _caches_lock:
+        if (path, url) not in _services:
+            _services[(path, url)] = ForecastService(cache, url)
+        return _services[(path, url)]
+
+
+class ForecastSummary:
+    def __init__(self, app, lat, lon, hours=DEFAULT_FORECAST_HOURS, service=None, cache_ttl=DEFAULT_CACHE_TTL,
+                 fetch_wait=DEFAULT_FETCH_WAIT, on_refresh=None, metrics=NULL_METRICS, aggregator=None):
+        self.app = app
+        self.metrics = metrics
+        self.lat = lat
+        self.lon = lon
+        self.service = service if service is not None else get_forecast_service()
+        self.cache = self.service.cache
+        self.cache_ttl = cache_ttl
+        self.fetch_wait = fetch_wait
+        self.on_refresh = on_refresh
+        #pass a long-lived aggregator to have summarize() only fold in what changed since last time
+        self.aggregator = aggregator if aggregator is not None else ForecastAggregator(HOURLY_VARIABLES)
+        self.is_stale = False
+        self.key = ForecastCache.make_key(lat, lon, HOURLY_VARIABLES, hours)
+        self.forecast_data = self._get_hourly_forecast(lat, lon, hours=hours)
+        
+    def get_forecast_data(self, start_time=None, end_time=None):
+        """
+        Returns the forecast data.
+        """
+               
+        return self.forecast_data
+
+    def revisions(self, local_dt):
+        """
+        How the forecast for the hour containing local_dt (naive local time) changed
+        across fetches, as (fetched_at, {variable: value}) pairs, oldest first.
+        """
+        return self.service.history(self.key, self.forecast_data.local_epoch(local_dt))
+        
+    @timed_method("get_hourly_forecast")
+    def _get_hourly_forecast(self, lat, lon, hours=6):
+        
+        key = ForecastCache.make_key(lat, lon, HOURLY_VARIABLES, hours)
+        data = self.cache.get(key, self.cache_ttl)
+        if data is None:
+            data = self._refresh_forecast(key, lat, lon, hours)
+        if data is None:
+            return ForecastSeries.empty(HOURLY_VARIABLES)
+
+        #timestamps are parsed once here; everything downstream works on the columns
+        return ForecastSeries.from_open_meteo(data, HOURLY_VARIABLES, hours=hours)
+
+    def _refresh_forecast(self, key, lat, lon, hours):
+        """
+        Start a background refresh of an expired forecast. If a previous forecast is still
+        cached it is returned straight away and on_refresh is called once the new one lands.
+        With nothing cached, callers with an on_refresh get None straight away and are called
+        back the same way; others wait up to fetch_wait seconds for the refresh to finish.
+        """
+        future = self.service.refresh(self.app, lat, lon, hours, self.cache_ttl, self.metrics)
+        last_good = self.cache.get(key, self.cache.max_age)
+
+        if last_good is not None:
+            self.is_stale = True
+            self.app.log("Cached forecast has expired, using it while a fresh one is fetched.", level="DEBUG")
+            if self.on_refresh is not None:
+                future.add_done_callback(self._on_refresh_done)
+            return last_good
+
+        if self.on_refresh is not None and not future.done():
+            #don't hold the AppDaemon thread on a cold start; re-plan once the forecast lands
+            self.app.log("No cached forecast yet, planning without one until the fetch finishes.", level="INFO")
+            future.add_done_callback(self._on_refresh_done)
+            return None
+
+        try:
+            return future.result(timeout=self.fetch_wait)
+        except FutureTimeoutError:
+            self.app.log(f"Forecast fetch did not finish within {self.fetch_wait}s and no cached forecast is available.", level="WARNING")
+            return None
+
+    def _on_refresh_done(self, future):
+        if future.exception() is None and future.result() is not None:
+            self.on_refresh()
+
+    @timed_method("warmest_hours")
+    def warmest_hours(self, minutes, score=temperature_score, finish_by=None, step_minutes=DEFAULT_STEP_MINUTES):
+        """
+        Find the best period of the given length that starts later today (not in the past).
+        Args:
+            minutes (int): The duration in minutes of the period, rounded up to step_minutes.
+            score (callable): Per-sample score function from optimizer.SCORES; defaults to
+                the forecast temperature.
+            finish_by (datetime): Optional naive local datetime the period must end by.
+            step_minutes (int): Resolution of the search; the hourly forecast is interpolated.
+        Returns:
+            tuple: A tuple containing:
+                - best_start_time (datetime): The starting time of the best period, or None
+                  if no period fits in the rest of today.
+                - duration (int): The length of the period in minutes.
+        Raises:
+            ValueError: If the forecast data is shorter than the required window size.
+        """
+        windows = self.candidate_windows(minutes, top_n=1, score=score, finish_by=finish_by, step_minutes=step_minutes)
+        duration = math.ceil(minutes / step_minutes) * step_minutes
+
+        if not windows:
+            self.app.log("No forecast window left today for the soak run.")
+            return None, duration
+
+        return windows[0].start, duration
+
+    @timed_method("candidate_windows")
+    def candidate_windows(self, minutes, top_n=3, score=temperature_score, finish_by=None, step_minutes=DEFAULT_STEP_MINUTES, now=None):
+        """
+        Top-N non-overlapping windows starting later today, best first. See WindowOptimizer.
+        now is a naive local datetime and defaults to the wall clock.
+        """
+        optimizer = WindowOptimizer(self.forecast_data, step_minutes)
+        return optimizer.best_windows(minutes, score=score, top_n=top_n, now=now or datetime.now(), today_only=True, finish_by=finish_by)
+
+    @timed_method("summarize")
+    def summarize(self):
+        """
+        Statistics for every window of the aggregator under "windows", plus the overnight
+        figures (if an "overnight" window is configured) at the top level.
+        """
+        series = self.forecast_data
+        if len(series):
+            self.aggregator.drop_before(series.times[0])
+        self.aggregator.update(series)
+        windows = self.aggregator.summaries()
+
+        overnight = windows.get("overnight")
+        if overnight is None:
+            return {"windows": windows}
+
+        temps = overnight["temperature_2m"]
+        if not temps["count"]:
+            self.app.log("No overnight data available for summary.")
+            return {}
+
+        return {
+            "min_forecast_temp_overnight": temps["min"],
+            "avg_forecast_temp_overnight": temps["mean"],
+            "avg_humidity_overnight": overnight["relative_humidity_2m"].get("mean"),
+            "avg_radiation_overnight": overnight["shortwave_radiation"].get("mean"),
+            "duration_below_zero": temps["hours_below"],
+            "degree_hours_below_zero": temps["degree_hours_below"],
+            "hour_of_min_temp": series.to_local_datetime(temps["min_at"]).hour,
+            "windows": windows,
+        }
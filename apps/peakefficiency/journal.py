@@ -0,0 +1,305 @@
+from dataclasses import replace
+import math
+import os
+
+from scheduler import SoakPlan, ZoneSlot
+from utils import to_float
+
+
+INPUT_TEXT_MAX_LENGTH = 255  # Home Assistant's hard limit for input_text values
+INPUT_TEXT_DEFAULT_MAX = 100  # an input_text's max attribute when it is not configured
+RECORD_SEPARATOR = ";"
+
+#record tags
+PLAN = "P"  # P,<started_at>,<entity id>:<offset>:<duration>,...
+START = "S"  # S,<zone>,<seconds since started_at>,<outside temp>,<start temp>; <zone> is its position in P
+END = "E"  # E,<zone>,<seconds since started_at>,<end temp>
+CLOSE = "X"  # X,<seconds since started_at>
+
+
+class JournalError(ValueError):
+    pass
+
+
+class RunJournal:
+    """
+    Append-only log of the soak run in progress, with an in-memory index of every zone's
+    state. Replaying it after a restart gives back the exact queue, which zones are
+    heating and when they started, and what has already been restored.
+    Notes:
+        - Records are short comma-separated lines. The plan record names each zone by its
+          entity id, later records by its position in the plan, so editing the configured
+          zones mid-run cannot change which zone a record means. Times are seconds since
+          the run started.
+        - Starting a run truncates the log, so it only ever holds the current run.
+        - The store is read once, in load(); after that every change is a single append.
+        - When an append does not fit the store, the log is rewritten as a snapshot of the
+          run (the zones not yet restored, and which have started). If even that does not
+          fit, nothing more is written until the next run, so the log never skips a record.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._zones = []  # entity ids in the order of the run's plan record
+        self._index = {}
+        self.started_at = None
+        self.plan = None  # SoakPlan of queued and in-flight zones, None when no run is open
+        self.completed = {}  # climate -> ZoneSlot of zones already restored
+        self.full = False  # the store could not hold this run's log
+
+    def load(self):
+        """
+        Read the store and rebuild the index. Raises JournalError if it cannot be replayed.
+        """
+        self._reset()
+        for record in self.store.read():
+            self._apply(record)
+        return self.plan
+
+    def begin(self, plan):
+        """
+        Start a new run: the log is truncated to this run's plan record.
+        """
+        self._reset()
+        record = self._plan_record(plan.started_at, plan.zones)
+        self._apply(record)
+        self._write(self.store.reset, [record])
+
+    def started(self, climate, at, outside_temp=None, start_temp=None):
+        self._append(self._start_record(self._zone(climate), at, outside_temp, start_temp))
+
+    def finished(self, climate, at, end_temp=None):
+        self._append(_join(END, self._zone(climate), self._since(at), _temp(end_temp)))
+
+    def close(self, at):
+        self._append(_join(CLOSE, self._since(at)))
+
+    def requeue(self, moves):
+        """
+        Move zones that have not started to new (offset, duration) pairs, given as
+        {climate: (offset, duration)}, by rewriting the log as a snapshot of the moved run.
+        If the store cannot hold it nothing changes and JournalError or OSError is raised.
+        """
+        slots = [self.plan.slot(climate) if self.plan else None for climate in moves]
+        if None in slots or any(s.started for s in slots):
+            raise JournalError("Only zones still waiting in the current run can be requeued.")
+        previous = {s.climate: (s.offset, s.duration) for s in slots}
+        for slot in slots:
+            slot.offset, slot.duration = (int(v) for v in moves[slot.climate])
+        try:
+            self.store.reset(self.snapshot())
+        except (JournalError, OSError):
+            for slot in slots:
+                slot.offset, slot.duration = previous[slot.climate]
+            raise
+        self._set_zones(self.plan.zones)
+        self.full = False
+
+    def state(self, climate):
+        """
+        "queued", "running", "done", or None when the zone is not part of the run.
+        """
+        if climate in self.completed:
+            return "done"
+        slot = self.plan.slot(climate) if self.plan else None
+        if slot is None:
+            return None
+        return "running" if slot.started else "queued"
+
+    def snapshot(self):
+        """
+        The shortest log that replays to the current state: the plan of the zones not yet
+        restored and a start record for each that is running. Empty when no run is open.
+        """
+        if self.plan is None:
+            return []
+        return [self._plan_record(self.started_at, self.plan.zones), *(
+            self._start_record(i, s.started_at, s.outside_temp, s.start_temp)
+            for i, s in enumerate(self.plan.zones) if s.started
+        )]
+
+    def snapshot_size(self, climates):
+        """
+        Characters the longest snapshot of a run of these zones can take in a store.
+        """
+        wide = 10 ** 6 - 1  # offsets, durations and times of up to 6 digits
+        records = [_join(PLAN, wide, *(f"{c}:{wide}:{wide}" for c in climates)),
+                   *(_join(START, i, wide, -99.9, -99.9) for i in range(len(climates)))]
+        return len(RECORD_SEPARATOR.join(records))
+
+    def _append(self, record):
+        if self.plan is None:
+            raise JournalError("No soak run is open in the journal.")
+        self._apply(record)
+        if self.full:
+            #already reported when the store filled up
+            return
+        try:
+            self.store.append(record)
+        except JournalError:
+            #rewrite the log as the run's current state, which also drops closed runs entirely
+            self._write(self.store.reset, self.snapshot())
+            self._set_zones(self.plan.zones if self.plan else [])
+
+    def _write(self, write, data):
+        try:
+            write(data)
+        except JournalError:
+            self.full = True
+            raise
+
+    def _plan_record(self, started_at, slots):
+        return _join(PLAN, int(started_at), *(f"{s.climate}:{s.offset}:{s.duration}" for s in slots))
+
+    def _start_record(self, zone, at, outside_temp, start_temp):
+        return _join(START, zone, self._since(at), _temp(outside_temp), _temp(start_temp))
+
+    def _apply(self, record):
+        try:
+            tag, *fields = record.split(",")
+            if tag == PLAN:
+                self._reset()
+                self.started_at = int(fields[0])
+                zones = []
+                for zone in fields[1:]:
+                    climate, offset, duration = zone.rsplit(":", 2)
+                    zones.append(ZoneSlot(climate=climate, offset=int(offset), duration=int(duration)))
+                self.plan = SoakPlan(started_at=self.started_at, zones=zones)
+                self._set_zones(zones)
+            elif self.plan is None:
+                raise JournalError(f"Record before the run's plan: {record!r}")
+            elif tag == START:
+                slot = self._slot(fields[0])
+                slot.started = True
+                slot.started_at = self.started_at + int(fields[1])
+                slot.outside_temp = _float(fields[2])
+                slot.start_temp = _float(fields[3])
+            elif tag == END:
+                slot = self._slot(fields[0])
+                self.plan.remove(slot.climate)
+                self.completed[slot.climate] = replace(
+                    slot, finished_at=self.started_at + int(fields[1]), end_temp=_float(fields[2]))
+            elif tag == CLOSE:
+                self.plan = None
+            else:
+                raise JournalError(f"Unknown journal record: {record!r}")
+        except JournalError:
+            raise
+        except (ValueError, IndexError) as e:
+            raise JournalError(f"Malformed journal record {record!r}: {e}") from e
+
+    def _set_zones(self, slots):
+        self._zones = [s.climate for s in slots]
+        self._index = {climate: i for i, climate in enumerate(self._zones)}
+
+    def _reset(self):
+        self._set_zones([])
+        self.started_at = None
+        self.plan = None
+        self.completed = {}
+        self.full = False
+
+    def _slot(self, field):
+        slot = self.plan.slot(self._zones[int(field)])
+        if slot is None:
+            raise JournalError(f"Zone {field} is not queued in the current run.")
+        return slot
+
+    def _zone(self, climate):
+        if climate not in self._index:
+            raise JournalError(f"{climate} is not part of the current run.")
+        return self._index[climate]
+
+    def _since(self, at):
+        return int(round(at - self.started_at))
+
+
+class FileJournalStore:
+    """
+    Journal kept in a local file, one record per line.
+    """
+
+    capacity = math.inf
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r") as f:
+            return [line for line in f.read().splitlines() if line]
+
+    def append(self, record):
+        with open(self.path, "a") as f:
+            f.write(record + "\n")
+
+    def reset(self, records):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("".join(r + "\n" for r in records))
+        os.replace(tmp_path, self.path)
+
+
+class HelperJournalStore:
+    """
+    Journal spread across input_text helpers: the records are joined with ';' and cut
+    into chunks of each helper's max length, one per helper. An append only rewrites the
+    helpers whose chunk changed, which is normally just the last one in use.
+    """
+
+    def __init__(self, app, entity_ids, mirror):
+        self.app = app
+        self.entity_ids = list(entity_ids)
+        self.mirror = mirror
+        self._text = ""
+        self._chunks = []
+
+    @property
+    def capacity(self):
+        return sum(self.sizes())
+
+    def sizes(self):
+        """
+        Characters each helper accepts: Home Assistant rejects values longer than its max.
+        """
+        return [min(INPUT_TEXT_MAX_LENGTH, int(to_float(self.mirror.get(e, attribute="max")) or INPUT_TEXT_DEFAULT_MAX))
+                for e in self.entity_ids]
+
+    def read(self):
+        self._chunks = [self.mirror.get(e) or "" for e in self.entity_ids]
+        self._text = "".join(self._chunks)
+        return [r for r in self._text.split(RECORD_SEPARATOR) if r]
+
+    def append(self, record):
+        self._write(f"{self._text}{RECORD_SEPARATOR}{record}" if self._text else record)
+
+    def reset(self, records):
+        self._write(RECORD_SEPARATOR.join(records))
+
+    def _write(self, text):
+        sizes = self.sizes()
+        if len(text) > sum(sizes):
+            raise JournalError(f"Run journal needs {len(text)} characters but {len(self.entity_ids)} helper(s) hold "
+                               f"{sum(sizes)}; raise their max, add helpers to journal_helpers or set journal_file.")
+        old = self._chunks + [""] * (len(self.entity_ids) - len(self._chunks))
+        chunks, start = [], 0
+        for size in sizes:
+            chunks.append(text[start:start + size])
+            start += size
+        self._text, self._chunks = text, chunks
+        for entity_id, chunk, previous in zip(self.entity_ids, chunks, old):
+            if chunk != previous:
+                self.app.call_service("input_text/set_value", entity_id=entity_id, value=chunk)
+
+
+def _join(*fields):
+    return ",".join("" if f is None else str(f) for f in fields)
+
+
+def _temp(value):
+    return None if value is None else f"{round(value, 1):g}"
+
+
+def _float(field):
+    return float(field) if field else None
@@ -1,284 +1,634 @@
-from datetime import time
-import hassapi as hass
-from datetime import timedelta
-import json
-from datetime import datetime, timezone
-from dataclasses import dataclass, asdict, fields
-from forecast import ForecastSummary
-from utils import HelperUtils
-
-
-DAILY_SCHEDULE_SOAK_RUN = time(8, 0, 0)  # figure out what time to run the soak run
-DEFAULT_RUN_AT_TIME = time(15, 0, 0)  # Default run time is 3 PM
-DEFAULT_HEATING_DURATION = 20 * 60  # Default heating duration in seconds
-DEFAULT_PEAK_HEAT_TEMP = 19.5  # Default peak heating temperature in Celsius
-DEFAULT_AWAY_MODE_TEMP = 13  # Default away mode temperature in Celsius
-
-#home assistant helpers
-RESTORE_TEMPERATURE_TIMER = "timer.peak_efficiency_retore_temperature"
-MANUAL_START = "input_boolean.start_peak_efficiency"
-DRY_RUN = "input_boolean.peak_efficiency_dry_run"
-CLIMATE_STATE = "input_text.peakefficiency_restore_state"
-OUTDOOR_TEMPERATURE_SENSOR = "sensor.condenser_temperature_sensor_temperature"
-AWAY_TARGET_TEMP = "input_number.away_mode_target_temperature"
-AWAY_PEAK_HEAT_TO_TEMP = "input_number.away_mode_peak_heat_to_tempearture"
-AWAY_MODE_ENABLED = "input_boolean.home_away_mode_enabled"
-PEAK_EFFICIENCY_DISABLED = "input_boolean.peak_efficiency_disabled"
-
-
-@dataclass
-class ClimateState:
-    climate: str
-    outside_temp: float
-    start_temp: float
-
-    def to_json(self):
-        """Convert the dataclass to a JSON string."""
-        return json.dumps(asdict(self))
-
-    @staticmethod
-    def from_json(json_str):
-        """Create a ClimateState instance from a JSON string."""
-        data = json.loads(json_str)
-        return ClimateState(**data)
-    
-class PeakEfficiency(hass.Hass):
-
-    def initialize(self):
-        
-        self.latitude = self.args.get("latitude")
-        self.longitude = self.args.get("longitude")
-        
-        if self.latitude is None or self.longitude is None:
-            self.log("Latitude and longitude arguments not provided, forecast will not be used", level="WARNING")
-            
-        hu = HelperUtils(self)
-        
-        self.schedule_handle = None
-        #make sure helpers exist, otherwise error out
-        #check if the timer exists
-        hu.assert_entity_exists(RESTORE_TEMPERATURE_TIMER, "Peak Efficiency Restore Timer")
-        hu.assert_entity_exists(CLIMATE_STATE, "Peak Efficiency Climate State Buffer")
-        hu.assert_entity_exists(AWAY_MODE_ENABLED, "Away Mode Enabled")
-        
-        hu.assert_entity_exists(MANUAL_START, "Peak Efficiency Manual Start", required=False)
-        hu.assert_entity_exists(DRY_RUN, "Peak Efficiency Dry Run", required=False)
-        hu.assert_entity_exists(OUTDOOR_TEMPERATURE_SENSOR, "Outdoor Temperature Sensor", required=False)
-        hu.assert_entity_exists(AWAY_TARGET_TEMP, "Away Mode Target Temperature", required=False)
-        hu.assert_entity_exists(AWAY_PEAK_HEAT_TO_TEMP, "Away Mode Peak Heat Temperature", required=False)
-        
-        self.restore_temp = hu.safe_get_float(AWAY_TARGET_TEMP, DEFAULT_AWAY_MODE_TEMP)
-        self.heat_to_temp = hu.safe_get_float(AWAY_PEAK_HEAT_TO_TEMP, DEFAULT_PEAK_HEAT_TEMP)
-
-        # Define custom heating durations for each zone (in seconds)
-        self.heat_durations = {
-            "climate.main_floor": 40 * 60,
-            "climate.master_bedroom": 20 * 60,
-            "climate.basement_master": 20 * 60,
-            "climate.basement_bunk_rooms": 30 * 60,
-            "climate.ski_room": 10 * 60
-        }
-
-        self.full_entity_list = list(self.heat_durations.keys())
-        self.active_queue = []  # Will store entities to run
-
-        # Optional trigger
-        self.listen_state(self.start_heat_soak, MANUAL_START, new="on")
-
-        #check if timer is running which means we are in the middle of a run
-        timer_state = self.get_state(RESTORE_TEMPERATURE_TIMER)
-        if timer_state == "active":
-            #get the state info
-            climate_state = self.get_climate_state(clear_after_reading=False)
-            #get time left on timer
-            hours, minutes, seconds = 0, 0, 0
-            finishes_at = self.get_state(RESTORE_TEMPERATURE_TIMER, attribute="finishes_at")
-            if finishes_at:
-                finishes_at_dt = datetime.fromisoformat(finishes_at)
-                now = datetime.now(timezone.utc)
-                time_left = finishes_at_dt - now
-
-                if time_left.total_seconds() > 0:
-                    hours, remainder = divmod(time_left.total_seconds(), 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    
-                #add the remaining thermostats to the queue after the current one
-                if climate_state and climate_state.climate in self.full_entity_list:
-                    start_index = self.full_entity_list.index(climate_state.climate) + 1
-                    self.active_queue = []
-                    found_current = False
-                    for entity in self.full_entity_list:
-                        if entity == climate_state.climate:
-                            found_current = True
-                            continue
-                        if found_current and self.get_state(entity) == "heat":
-                            self.active_queue.append(entity)
-            else:
-                self.log("Could not retrieve 'finishes_at' attribute from the timer.")
-            
-            self.log(f"PeakEfficiency timer is active for {climate_state.climate}, temperature will be restored in {int(hours)} hours, {int(minutes)} minutes, {int(seconds)} seconds.")
-        
-        #using timer helper from home assistant to restore the temperature even if home assistant reboots
-        self.listen_event(self.stop_heat_soak, "timer.finished", entity_id=RESTORE_TEMPERATURE_TIMER)
-        
-        #run manually and then run the scheduler daily to figure when the best time to run override based on the weather forecast
-        self.schedule_energy_soak_run()
-        self.run_daily(self.schedule_energy_soak_run, DAILY_SCHEDULE_SOAK_RUN)
-        
-        self.log(f"PeakEfficiency initialized.")
-        
-    def schedule_energy_soak_run(self, entity=None, attribute=None, old=None, new=None, kwargs=None):
-        '''Figure out when the best time to run is based on the forecast.'''
-        
-        run_at = DEFAULT_RUN_AT_TIME
-        
-        if self.latitude is not None and self.longitude is not None:
-            forecastSummary = ForecastSummary(self, self.latitude, self.longitude)
-            
-            forecast = forecastSummary.get_forecast_data()
-            
-            for f_time, f_temp, f_humidity, f_radiation in forecast:
-                self.log(f"Forecast for {f_time}: Temp: {f_temp}C, Humidity: {f_humidity}%, Radiation: {f_radiation}W/m2", level="DEBUG")
-            
-            #get total run time of heat_durations
-            total_run_time = sum(self.heat_durations.values()) / 60  # convert to minutes
-            
-            best_start_time, _ = forecastSummary.warmest_hours(total_run_time)
-            
-            self.log(f"Best start time based on weather forecast is: {best_start_time}", level="INFO")
-            
-            run_at = best_start_time.time() if best_start_time else run_at
-        else:
-            self.log("Latitude and longitude not set, using default run time.", level="WARNING")
-       
-        if self.schedule_handle is not None:
-            self.log(f"PeakEfficiency already scheduled for {self.schedule_handle}, cancelling it.")
-            self.cancel_timer(self.schedule_handle)
-            
-        #only run this while in away mode
-        if self._is_away_mode_enabled():
-            self.schedule_handle = self.run_daily(self.start_heat_soak, run_at)
-      
-            run_at_am_pm = run_at.strftime("%I:%M %p")
-            self.log(f"PeakEfficiency will run today at {run_at_am_pm}.", level="INFO")
-        else:
-            if not self._is_away_mode_enabled():
-                self.log("PeakEfficiency will not run today because away mode is not enabled.", level="INFO")
-
-
-    def start_heat_soak(self, entity=None, attribute=None, old=None, new=None, kwargs=None):
-
-        if self._is_peak_efficiency_disabled():
-            self.log("Peak Efficiency is disabled, not starting heat soak.", level="INFO")
-            return
-
-        # Create a queue of entities that are in heat mode
-        self.active_queue = [e for e in self.full_entity_list if self.get_state(e) == "heat"]
-
-        if not self.active_queue:
-            self.log("No climate entities in heat mode — nothing to do.")
-            return
-
-        self.log(f"Starting peak override for {len(self.active_queue)} climate entities.")
-        self.process_next_zone()
-
-    def process_next_zone(self, kwargs=None):
-        if not self.active_queue:
-            self.log("All climate entities have been processed.")
-            return
-
-        climate = self.active_queue.pop(0)
-        heat_duration = self.heat_durations.get(climate, DEFAULT_HEATING_DURATION)
-        self.log(f"Overriding {climate} to {self.heat_to_temp}C for {heat_duration // 60} minutes.")
-
-        do_dry_run = self.get_state(DRY_RUN) == "on"
-        if not do_dry_run:
-            self.call_service("climate/set_temperature", entity_id=climate, temperature=self.heat_to_temp)
-            
-        self.log(f"{'DRY RUN - ' if do_dry_run else ''}{climate}: Setting temperature to {self.heat_to_temp}C")         
-
-        outside_temp = self.get_state(OUTDOOR_TEMPERATURE_SENSOR)
-        current_temp = self.get_state(climate, attribute="current_temperature")
-
-        self.save_climate_state(ClimateState(climate=climate, outside_temp=outside_temp, start_temp=current_temp))
-        self.call_service("timer/start", entity_id=RESTORE_TEMPERATURE_TIMER, duration=str(timedelta(seconds=heat_duration)))
-        
-    def stop_heat_soak(self, event_name, data, kwargs):
-        
-        climate_state = self.get_climate_state()
-
-        climate = climate_state.climate
-        outside_temp = climate_state.outside_temp
-        start_temp = climate_state.start_temp
-        current = self.get_state(climate, attribute="current_temperature")
-        
-        do_dry_run = self.get_state(DRY_RUN) == "on"
-        if not do_dry_run: 
-            self.call_service("climate/set_temperature", entity_id=climate, temperature=self.restore_temp)
-
-        self.log(f"{'DRY RUN - ' if do_dry_run else ''}{climate}: Restored temperature to {self.restore_temp}C -- Outside: {outside_temp}C | Start: {start_temp}C | End: {current}C")    
-
-        # Process the next entity after this one finishes
-        self.process_next_zone()
-        
-    def save_climate_state(self, state: ClimateState):
-        """
-        Save a ClimateState object to an input_text entity.
-        Raises an error if the input_text entity is not empty.
-        """
-        current_value = self.get_state(CLIMATE_STATE)
-        if current_value != "":
-            raise ValueError(f"Cannot save state to {{CLIMATE_STATE}}: it is not empty, got {current_value}")
-        
-        try:
-            self.call_service("input_text/set_value", entity_id=CLIMATE_STATE, value=state.to_json())
-            self.log(f"State saved to {{CLIMATE_STATE}}: {state}", level="DEBUG")
-        except Exception as e:
-            self.error(f"Failed to save state to {{CLIMATE_STATE}}: {e}")
-            raise
-
-    def get_climate_state(self, clear_after_reading=True) -> ClimateState:
-        """
-        Retrieve and decode the state from an input_text entity as a ClimateState object.
-        """
-        try:
-            raw_state = self.get_state(CLIMATE_STATE)
-            if not raw_state:
-                raise ValueError(f"State in {{CLIMATE_STATE}} is empty or unavailable.")
-            if clear_after_reading:
-                self.clear_climate_state()
-            return ClimateState.from_json(raw_state)
-        except json.JSONDecodeError as e:
-            self.error(f"Failed to decode state from {{CLIMATE_STATE}}: {e}")
-            raise
-        except Exception as e:
-            self.error(f"Unexpected error while retrieving state from {{CLIMATE_STATE}}: {e}")
-            raise
-
-    def clear_climate_state(self):
-        """
-        Clear the state in an input_text entity by calling save_state with an empty ClimateState.
-        """
-        try:
-            self.call_service("input_text/set_value", entity_id=CLIMATE_STATE, value="")
-            self.log(f"State cleared for {{CLIMATE_STATE}}", level="DEBUG")
-        except Exception as e:
-            self.error(f"Failed to clear state for {{CLIMATE_STATE}}: {e}")
-            raise
-        
-    def _is_away_mode_enabled(self):
-        """
-        Check if the home/away mode is enabled.
-        """
-        return self.get_state(AWAY_MODE_ENABLED) == "on"
-    
-    def _is_peak_efficiency_disabled(self):
-        """
-        Check if the peak efficiency is disabled.
-        """
-        return self.get_state(PEAK_EFFICIENCY_DISABLED) == "on"
-        
-    def terminate(self):
-        #not using this for now
-        pass
-
+from datetime import time
+import hassapi as hass
+from datetime import datetime, timedelta
+from time import perf_counter
+import heapq
+import itertools
+import math
+import os
+import sqlite3
+from drift import DriftMonitor, DEFAULT_DRIFT_THRESHOLD, DEFAULT_REPLAN_COOLDOWN
+from aggregator import ForecastAggregator, parse_windows, DEFAULT_WINDOWS, DEFAULT_THRESHOLD
+from forecast import ForecastSummary, get_forecast_service, DEFAULT_CACHE_FILE, DEFAULT_CACHE_TTL, DEFAULT_FORECAST_HOURS, OPEN_METEO_URL, HOURLY_VARIABLES
+from journal import RunJournal, FileJournalStore, HelperJournalStore, JournalError
+from metrics import Metrics, timed_method
+from optimizer import SCORES, WindowOptimizer
+from registry import ZoneRegistry, Helpers
+from thermal import ThermalModel, SoakHistory, SETPOINT_TOLERANCE
+from scheduler import SoakPlan, DailySchedule, pack_zones, makespan, DAILY_SCHEDULE_SOAK_RUN, DEFAULT_RUN_AT_TIME
+from utils import HelperUtils, StateMirror, to_float
+
+
+DEFAULT_HEATING_DURATION = 20 * 60  # Default heating duration in seconds
+DEFAULT_PEAK_HEAT_TEMP = 19.5  # Default peak heating temperature in Celsius
+DEFAULT_AWAY_MODE_TEMP = 13  # Default away mode temperature in Celsius
+DEFAULT_MAX_CONCURRENT_ZONES = 1  # Zones heated at the same time
+DEFAULT_METRICS_PUBLISH_INTERVAL = 5 * 60  # seconds between sensor.peak_efficiency_* updates
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))  # default home of the <app name>_* state files
+
+
+class PeakEfficiency(hass.Hass):
+
+    def initialize(self):
+        init_started = perf_counter()
+        
+        #hot-path timings; optionally published as sensor.peak_efficiency_* entities
+        self.metrics = Metrics(enabled=self.args.get("metrics_enabled", True))
+        
+        self.latitude = self.args.get("latitude")
+        self.longitude = self.args.get("longitude")
+        
+        if self.latitude is None or self.longitude is None:
+            self.log("Latitude and longitude arguments not provided, forecast will not be used", level="WARNING")
+            
+        #forecasts are cached in memory and on disk so reloads and restarts don't refetch them,
+        #and every site in this AppDaemon process is refreshed in one batched request
+        self.forecast_service = get_forecast_service(self.args.get("forecast_cache_file", DEFAULT_CACHE_FILE),
+                                                     self.args.get("forecast_url", OPEN_METEO_URL))
+        self.forecast_cache_ttl = self.args.get("forecast_cache_ttl", DEFAULT_CACHE_TTL)
+        self.forecast_site = None
+        if self.latitude is not None and self.longitude is not None:
+            self.forecast_site = self.forecast_service.register(self.latitude, self.longitude, DEFAULT_FORECAST_HOURS, self.forecast_cache_ttl)
+
+        #how soak windows are scored and the latest time a soak may finish
+        score_name = self.args.get("window_score", "temperature")
+        if score_name not in SCORES:
+            self.log(f"Unknown window_score '{score_name}', using temperature. Options: {', '.join(SCORES)}", level="WARNING")
+            score_name = "temperature"
+        self.window_score = SCORES[score_name]
+        finish_by = self.args.get("soak_finish_by")
+        self.soak_finish_by = time.fromisoformat(finish_by) if finish_by else None
+
+        #named forecast windows summarized on every re-plan, e.g. {overnight: [20, 8]}
+        windows = self.args.get("summary_windows")
+        self.forecast_aggregator = ForecastAggregator(HOURLY_VARIABLES, parse_windows(windows) if windows else DEFAULT_WINDOWS,
+                                                      self.args.get("degree_hour_threshold", DEFAULT_THRESHOLD))
+
+        #zones (durations, priorities, groups) and helper entities are declared in the app config
+        self.helpers = Helpers.from_config(self.args.get("helpers"))
+        self.zones = ZoneRegistry.from_config(self.args.get("zones"), DEFAULT_HEATING_DURATION)
+        self.full_entity_list = self.zones.ids()
+        self.zone_priority = {z.climate: z.priority for z in self.zones}
+
+        #the run journal lives in a local file, or across the input_text helpers in journal_helpers
+        journal_helpers = self.args.get("journal_helpers", [])
+        journal_file = None if journal_helpers else self.args.get("journal_file", os.path.join(DATA_DIR, f"{self.name}_journal.log"))
+
+        #mirror every entity we read with one bulk call, then keep it current from state events
+        self.state_mirror = StateMirror(self, [*self.helpers.entities(), *journal_helpers, *self.full_entity_list])
+        self.state_mirror.load()
+
+        hu = HelperUtils(self, self.state_mirror)
+        
+        self.schedule_handle = None
+        #make sure helpers exist, otherwise error out
+        for helper in journal_helpers:
+            hu.assert_entity_exists(helper, "Peak Efficiency Run Journal")
+        hu.assert_entity_exists(self.helpers.away_mode_enabled, "Away Mode Enabled")
+        
+        hu.assert_entity_exists(self.helpers.manual_start, "Peak Efficiency Manual Start", required=False)
+        hu.assert_entity_exists(self.helpers.dry_run, "Peak Efficiency Dry Run", required=False)
+        hu.assert_entity_exists(self.helpers.outdoor_temperature, "Outdoor Temperature Sensor", required=False)
+        hu.assert_entity_exists(self.helpers.away_target_temp, "Away Mode Target Temperature", required=False)
+        hu.assert_entity_exists(self.helpers.away_peak_heat_to_temp, "Away Mode Peak Heat Temperature", required=False)
+        
+        self.restore_temp = hu.safe_get_float(self.helpers.away_target_temp, DEFAULT_AWAY_MODE_TEMP)
+        self.heat_to_temp = hu.safe_get_float(self.helpers.away_peak_heat_to_temp, DEFAULT_PEAK_HEAT_TEMP)
+
+        #how many zones may heat at once, optionally capped by their electrical load
+        self.max_concurrent_zones = self.args.get("max_concurrent_zones", DEFAULT_MAX_CONCURRENT_ZONES)
+        self.zone_power_kw = {**self.args.get("zone_power_kw", {}),
+                              **{z.climate: z.power_kw for z in self.zones if z.power_kw is not None}}
+        self.power_budget_kw = self.args.get("power_budget_kw")
+
+        #every finished soak trains a per-zone heating rate model, which shortens a zone's soak
+        #when the forecast outdoor temperature says it will reach heat_to_temp sooner
+        self.learned_durations = self.args.get("learned_durations", True)
+        history_file = self.args.get("soak_history_file", os.path.join(DATA_DIR, f"{self.name}_soaks.sqlite"))
+        self.thermal_model = ThermalModel(SoakHistory(history_file))
+        self.forecast_series = None  # ForecastSeries from the last re-plan
+
+        #the outdoor sensor is compared with the forecast as it reports; once the forecast's error
+        #trends far enough across the day the pending start and queued zones are re-planned on the
+        #cached forecast
+        self.drift = DriftMonitor(threshold=self.args.get("replan_drift_threshold", DEFAULT_DRIFT_THRESHOLD),
+                                  cooldown=self.args.get("replan_cooldown", DEFAULT_REPLAN_COOLDOWN))
+
+        self.soak_plan = None  # SoakPlan of the run in progress
+        self.zone_timers = {}  # climate -> handle of its restore timer
+        self.zone_watches = {}  # climate -> current_temperature listener of a zone started by this instance
+        self.zone_reached = {}  # climate -> (seconds after its start, temperature) once it reached heat_to_temp
+        self.zone_queue = []  # heap of (start epoch, seq, climate) of zones waiting to start
+        self.queue_timer = None  # handle of the timer for the head of zone_queue
+        self._queue_seq = itertools.count()
+        store = FileJournalStore(journal_file) if journal_file else HelperJournalStore(self, journal_helpers, self.state_mirror)
+        self.journal = RunJournal(store)
+        needed = self.journal.snapshot_size(self.full_entity_list)
+        if needed > store.capacity:
+            self.log(f"A run of {len(self.full_entity_list)} zones can need {needed} characters of run journal but "
+                     f"journal_helpers hold {store.capacity}; raise their max, add helpers or set journal_file, "
+                     f"or runs may not be resumed after a restart.", level="WARNING")
+
+        # Optional trigger
+        self.listen_state(self.start_heat_soak, self.helpers.manual_start, new="on")
+        if self.args.get("intraday_replan", True):
+            self.listen_state(self.on_outdoor_temperature, self.helpers.outdoor_temperature)
+
+        #an open run in the journal means AppDaemon restarted in the middle of it
+        self.resume_soak_plan()
+        
+        #re-arm the last planned start time straight away; checking it against the forecast
+        #can mean a network fetch, so it runs after initialize has returned
+        self.schedule_file = self.args.get("schedule_file", os.path.join(DATA_DIR, f"{self.name}_schedule.json"))
+        self.daily_schedule = None
+        saved = DailySchedule.load(self.schedule_file)
+        if saved is not None:
+            self.log(f"Restored the saved soak schedule for {saved.run_at}.", level="DEBUG")
+            self.apply_schedule(saved)
+
+        #run now and then run the scheduler daily to figure when the best time to run override based on the weather forecast
+        self.run_in(self.schedule_energy_soak_run, 0)
+        self.run_daily(self.schedule_energy_soak_run, DAILY_SCHEDULE_SOAK_RUN)
+
+        if self.metrics.enabled and self.args.get("publish_metrics", False):
+            interval = self.args.get("metrics_publish_interval", DEFAULT_METRICS_PUBLISH_INTERVAL)
+            self.run_every(self.publish_metrics, f"now+{interval}", interval)
+        
+        if self.metrics.enabled:
+            self.metrics.record("initialize", perf_counter() - init_started)
+        self.log(f"PeakEfficiency initialized.")
+        
+    @timed_method("schedule_energy_soak_run")
+    def schedule_energy_soak_run(self, entity=None, attribute=None, old=None, new=None, kwargs=None):
+        '''Figure out when the best time to run is based on the forecast.'''
+        
+        if self._ran_today():
+            #a window later today would start a second soak; tomorrow's is planned at DAILY_SCHEDULE_SOAK_RUN
+            self.log("Today's soak has already run, not re-planning it.", level="DEBUG")
+            return
+
+        run_at = DEFAULT_RUN_AT_TIME
+        
+        if self.latitude is not None and self.longitude is not None:
+            forecastSummary = ForecastSummary(self, self.latitude, self.longitude, service=self.forecast_service, cache_ttl=self.forecast_cache_ttl,
+                                              on_refresh=self._on_forecast_refreshed, metrics=self.metrics, aggregator=self.forecast_aggregator)
+            
+            forecast = forecastSummary.get_forecast_data()
+            self.forecast_series = forecast
+            
+            for f_time, f_temp, f_humidity, f_radiation in forecast.rows(*HOURLY_VARIABLES):
+                self.log(f"Forecast for {f_time}: Temp: {f_temp}C, Humidity: {f_humidity}%, Radiation: {f_radiation}W/m2", level="DEBUG")
+
+            for name, stats in forecastSummary.summarize().get("windows", {}).items():
+                temps = stats["temperature_2m"]
+                if temps["count"]:
+                    self.log(f"Forecast {name}: {temps['min']:.1f} to {temps['max']:.1f}C, mean {temps['mean']:.1f}C, "
+                             f"{temps['degree_hours_below']:.1f} degree-hours below {self.forecast_aggregator.stats[name]['temperature_2m'].threshold}C", level="DEBUG")
+            
+            best_start_time, slots = self.search_start(self.full_entity_list)
+            
+            self.log(f"Best start time based on weather forecast is: {best_start_time}", level="INFO")
+            
+            run_at = best_start_time.time() if best_start_time else run_at
+        else:
+            self.log("Latitude and longitude not set, using default run time.", level="WARNING")
+            slots = self.plan_zones(self.full_entity_list)
+
+        self.commit_schedule(run_at, slots)
+        self.drift.planned(self.get_now_ts())
+
+    def search_start(self, zones, earliest=None):
+        """
+        Best start later today, no earlier than earliest (naive local time, default now),
+        for the zones packed together, in the bias-corrected forecast. With learned
+        durations the zones are re-sized for the chosen window and searched again.
+        Returns:
+            tuple: (best start as a naive local datetime or None, slots)
+        """
+        now = self.datetime()
+        earliest = earliest or now
+        slots = self.plan_zones(zones)
+        series = self.drift.correct(self.forecast_series, self.get_now_ts())
+        finish_by = datetime.combine(now.date(), self.soak_finish_by) if self.soak_finish_by else None
+        if series is None:
+            return None, slots
+
+        windows = self.candidate_windows(series, slots, earliest, finish_by)
+        if windows and self.learned_durations:
+            #size each zone for the temperature forecast over the chosen window, then search again
+            #if that changed how long the soak takes
+            outside_temp = self.forecast_outside_temp(windows[0].start, makespan(slots))
+            learned = self.plan_zones(zones, outside_temp)
+            if makespan(learned) != makespan(slots):
+                self.log(f"Learned zone durations for {outside_temp:.1f}C take {makespan(learned) // 60} minutes "
+                         f"instead of {makespan(slots) // 60}.", level="DEBUG")
+                windows = self.candidate_windows(series, learned, earliest, finish_by) or windows
+            slots = learned
+
+        for window in windows:
+            self.log(f"Candidate window {window.start} - {window.end}: score {window.score:.2f}", level="DEBUG")
+        return (windows[0].start if windows else None), slots
+
+    def candidate_windows(self, series, slots, earliest, finish_by=None):
+        """
+        Top non-overlapping windows later today that fit the packed slots, best first.
+        """
+        #get total run time of the zones once packed into the concurrency budget
+        total_run_time = makespan(slots) / 60  # convert to minutes
+        try:
+            with self.metrics.timed("candidate_windows"):
+                return WindowOptimizer(series).best_windows(total_run_time, score=self.window_score, top_n=3, now=earliest,
+                                                            today_only=True, finish_by=finish_by)
+        except ValueError as e:
+            self.log(f"Could not search the forecast: {e}", level="WARNING")
+            return []
+
+    def commit_schedule(self, run_at, slots):
+        """
+        Arm and save the daily start for the planned zones.
+        """
+        ran_on = self.daily_schedule.ran_on if self.daily_schedule else None
+        schedule = DailySchedule(run_at=run_at, zones=[s.climate for s in slots], planned_at=self.get_now_ts(), ran_on=ran_on)
+        if self.apply_schedule(schedule):
+            self._save_schedule(schedule)
+
+    def _save_schedule(self, schedule):
+        try:
+            schedule.save(self.schedule_file)
+        except OSError as e:
+            self.log(f"Could not save the soak schedule to {self.schedule_file}: {e}", level="WARNING")
+
+    def _ran_today(self):
+        return self.daily_schedule is not None and self.daily_schedule.ran_on == self.datetime().date()
+
+    def on_outdoor_temperature(self, entity, attribute, old, new, kwargs):
+        """
+        Fold each outdoor sensor reading into the forecast error and re-plan once its trend has moved.
+        """
+        now = self.get_now_ts()
+        if self.drift.observe(now, to_float(new), self.forecast_series):
+            self.log(f"Outdoor sensor is {self.drift.bias:+.1f}C off the forecast, changing by {self.drift.trend:+.2f}C/h "
+                     f"({self.drift.drift:+.1f}C since the last plan), re-planning.", level="INFO")
+            self.replan_intraday()
+            self.drift.planned(now)
+
+    @timed_method("replan_intraday")
+    def replan_intraday(self):
+        """
+        Re-plan on the cached forecast, corrected for the error trend seen so far: zones of a run
+        in progress that have not started are moved to the warmest window left, otherwise
+        today's start is moved if it is still ahead. Nothing is fetched.
+        """
+        if self.soak_plan is not None:
+            self.requeue_zones()
+            return
+
+        schedule = self.daily_schedule
+        if schedule is None or self.schedule_handle is None:
+            return
+        now = self.datetime()
+        if datetime.combine(now.date(), schedule.run_at) <= now:
+            #today's run has already started; tomorrow's is planned at DAILY_SCHEDULE_SOAK_RUN
+            return
+        zones = [z for z in schedule.zones if z in self.zones] or self.full_entity_list
+        best_start_time, slots = self.search_start(zones)
+        if best_start_time is not None and best_start_time.time() != schedule.run_at:
+            self.log(f"Moving today's soak from {schedule.run_at} to {best_start_time.time()}.", level="INFO")
+            self.commit_schedule(best_start_time.time(), slots)
+
+    def requeue_zones(self):
+        """
+        Move the zones still waiting in the current run to the best window that starts once
+        every running zone has been restored, re-arming the queue timer.
+        """
+        plan = self.soak_plan
+        waiting = [s for s in plan.zones if not s.started]
+        if not waiting:
+            return
+
+        now_ts = self.get_now_ts()
+        free_at = max([now_ts, *(s.started_at + s.duration for s in plan.zones if s.started and s.started_at is not None)])
+        earliest = self.datetime() + timedelta(seconds=free_at - now_ts)
+        best_start_time, slots = self.search_start([s.climate for s in waiting], earliest)
+        if best_start_time is None:
+            return
+
+        start = now_ts + (best_start_time - self.datetime()).total_seconds()
+        current = min(plan.started_at + s.offset for s in waiting)
+        if abs(start - current) < 60:
+            return
+        try:
+            self.journal.requeue({s.climate: (int(start - plan.started_at) + s.offset, s.duration) for s in slots})
+        except (JournalError, OSError) as e:
+            self.log(f"Not moving the waiting zones, the run journal could not record it: {e}", level="WARNING")
+            return
+        self.log(f"Moving {len(slots)} waiting zones to start at {best_start_time.time()}.", level="INFO")
+        self.zone_queue = []
+        self._queue_zones(waiting)
+
+    def apply_schedule(self, schedule):
+        '''
+        Arm the daily start timer for a schedule. Returns False, leaving the timer alone,
+        when the schedule matches the one already armed.
+        '''
+        away = self._is_away_mode_enabled()
+        if schedule.same_as(self.daily_schedule) and (self.schedule_handle is not None) == away:
+            self.log(f"Soak schedule for {schedule.run_at} is unchanged.", level="DEBUG")
+            return False
+        self.daily_schedule = schedule
+
+        if self.schedule_handle is not None:
+            self.log(f"PeakEfficiency already scheduled for {self.schedule_handle}, cancelling it.")
+            self.cancel_timer(self.schedule_handle)
+            self.schedule_handle = None
+            
+        #only run this while in away mode
+        if away:
+            self.schedule_handle = self.run_daily(self.run_scheduled_soak, schedule.run_at)
+      
+            run_at_am_pm = schedule.run_at.strftime("%I:%M %p")
+            self.log(f"PeakEfficiency will run today at {run_at_am_pm}.", level="INFO")
+        else:
+            self.log("PeakEfficiency will not run today because away mode is not enabled.", level="INFO")
+        return True
+
+
+    def _on_forecast_refreshed(self):
+        """
+        Called from the forecast thread pool when a fresh forecast replaces the stale one
+        we planned with. Hop back onto an AppDaemon thread to re-plan.
+        """
+        self.log("Fresh forecast available, re-planning the soak run.", level="DEBUG")
+        self.run_in(self.schedule_energy_soak_run, 0)
+
+    def plan_zones(self, zones, outside_temp=None):
+        """
+        Pack the given zones into start offsets that respect the concurrency and power budget.
+        With an outdoor temperature, zones the thermal model has learned are sized for it.
+        """
+        durations = {}
+        for zone in zones:
+            registered = self.zones.get(zone)
+            durations[zone] = registered.duration if registered else DEFAULT_HEATING_DURATION
+            if self.learned_durations and outside_temp is not None:
+                start_temp = to_float(self.state_mirror.get(zone, attribute="current_temperature"))
+                durations[zone] = self.thermal_model.duration(zone, outside_temp, start_temp, self.heat_to_temp, durations[zone])
+        return pack_zones(durations, self.max_concurrent_zones, self.zone_power_kw, self.power_budget_kw,
+                          priority=self.zone_priority)
+
+    def forecast_outside_temp(self, start, seconds):
+        """
+        Mean bias-corrected forecast temperature over the seconds after start (naive local
+        time), or the outdoor sensor's reading when no forecast covers it.
+        """
+        series = self.forecast_series
+        if series is not None and len(series):
+            epoch = series.local_epoch(start)
+            temps = series.values_between("temperature_2m", epoch, epoch + seconds)
+            if temps:
+                #corrected for the drift the outdoor sensor has shown from the forecast so far
+                return math.fsum(temps) / len(temps) + self.drift.correction(epoch + seconds / 2 - self.get_now_ts())
+        return to_float(self.state_mirror.get(self.helpers.outdoor_temperature))
+
+    def run_scheduled_soak(self, kwargs):
+        """
+        The daily start timer. Re-planning after today's soak (a reload, a late forecast) can
+        arm a start later the same day, so the day the soak last ran is saved and checked.
+        """
+        if self._ran_today():
+            self.log("Today's soak has already run, not starting another one.", level="INFO")
+            return
+        self.daily_schedule.ran_on = self.datetime().date()
+        self._save_schedule(self.daily_schedule)
+        self.start_heat_soak()
+
+    @timed_method("start_heat_soak")
+    def start_heat_soak(self, entity=None, attribute=None, old=None, new=None, kwargs=None):
+
+        if self._is_peak_efficiency_disabled():
+            self.log("Peak Efficiency is disabled, not starting heat soak.", level="INFO")
+            return
+
+        if self.soak_plan is not None:
+            self.log("A heat soak is already in progress, not starting another one.", level="WARNING")
+            return
+
+        # Plan the entities that are in heat mode
+        zones = [e for e in self.full_entity_list if self.state_mirror.get(e) == "heat"]
+
+        if not zones:
+            self.log("No climate entities in heat mode — nothing to do.")
+            return
+
+        outside_temp = self.forecast_outside_temp(self.datetime(), makespan(self.plan_zones(zones))) if self.learned_durations else None
+        slots = self.plan_zones(zones, outside_temp)
+        self._journal(self.journal.begin, SoakPlan(started_at=self.get_now_ts(), zones=slots))
+        self.soak_plan = self.journal.plan
+
+        self.log(f"Starting peak override for {len(slots)} climate entities, up to {self.max_concurrent_zones} at a time, "
+                 f"finishing in {makespan(slots) // 60} minutes.")
+        for slot in slots:
+            zone = self.zones.get(slot.climate)
+            group = f" [{zone.group}]" if zone and zone.group else ""
+            self.log(f"{slot.climate}{group}: heating from +{slot.offset // 60} to +{slot.end // 60} minutes.", level="DEBUG")
+        self._queue_zones(slots)
+
+    def resume_soak_plan(self):
+        """
+        Replay the run journal and re-arm the start and restore timers of a run that was
+        open when AppDaemon stopped. Zones whose restore time has already passed are
+        restored straight away.
+        """
+        try:
+            self.soak_plan = self.journal.load()
+        except JournalError as e:
+            #the records before the bad one still say which zones were heating; don't leave them at heat_to_temp
+            running = [s.climate for s in self.journal.plan.zones if s.started] if self.journal.plan else []
+            self.log(f"Discarding unreadable run journal: {e}", level="WARNING")
+            for climate in running:
+                self.log(f"Restoring {climate} to {self.restore_temp}C, it was heating when the journal broke off.", level="WARNING")
+                if self.state_mirror.get(self.helpers.dry_run) != "on":
+                    self.call_service("climate/set_temperature", entity_id=climate, temperature=self.restore_temp)
+            self.soak_plan = None
+            self._journal(self.journal.store.reset, [])
+            return
+
+        if self.soak_plan is None:
+            return
+
+        now = self.get_now_ts()
+        for slot in [s for s in self.soak_plan.zones if not s.started and s.climate not in self.zones]:
+            self.log(f"{slot.climate} was removed from zones, dropping it from the resumed run.", level="WARNING")
+            self._journal(self.journal.finished, slot.climate, now)
+        if not self.soak_plan.zones:
+            #every zone was restored but the run was never closed
+            self.soak_plan = None
+            self._journal(self.journal.close, now)
+            return
+
+        for slot in self.soak_plan.zones:
+            start_at = self.soak_plan.started_at + slot.offset
+            if slot.started:
+                #restore relative to when the zone actually started, not when it was planned to
+                delay = max(0, (slot.started_at or start_at) + slot.duration - now)
+                self._schedule_zone_timer(slot.climate, self.stop_heat_soak, delay)
+                self.log(f"PeakEfficiency is active for {slot.climate}, temperature will be restored in {int(delay // 60)} minutes.")
+            else:
+                self.log(f"PeakEfficiency will start {slot.climate} in {int(max(0, start_at - now) // 60)} minutes.")
+        self._queue_zones([s for s in self.soak_plan.zones if not s.started])
+
+    def _queue_zones(self, slots):
+        for slot in slots:
+            heapq.heappush(self.zone_queue, (self.soak_plan.started_at + slot.offset, next(self._queue_seq), slot.climate))
+        self._arm_queue()
+
+    def _arm_queue(self):
+        """
+        One timer covers every queued zone: it is armed for whichever zone starts next.
+        """
+        if self.queue_timer is not None:
+            self.cancel_timer(self.queue_timer)
+            self.queue_timer = None
+        if self.zone_queue:
+            delay = max(0, self.zone_queue[0][0] - self.get_now_ts())
+            self.queue_timer = self.run_in(self.process_next_zone, int(delay))
+
+    def _schedule_zone_timer(self, climate, callback, delay):
+        handle = self.zone_timers.pop(climate, None)
+        if handle is not None:
+            self.cancel_timer(handle)
+        self.zone_timers[climate] = self.run_in(callback, int(delay), climate=climate)
+
+    @timed_method("process_next_zone")
+    def process_next_zone(self, kwargs=None):
+        """
+        Start every queued zone due at the head of the queue, then re-arm for the next one.
+        """
+        self.queue_timer = None
+        if self.zone_queue:
+            due = self.zone_queue[0][0]
+            while self.zone_queue and self.zone_queue[0][0] == due:
+                self._start_zone(heapq.heappop(self.zone_queue)[2])
+        self._arm_queue()
+
+    def _start_zone(self, climate):
+        slot = self.soak_plan.slot(climate) if self.soak_plan else None
+        if slot is None or slot.started:
+            self.log(f"{climate} is not waiting in the current heat soak, skipping.", level="WARNING")
+            return
+
+        self.log(f"Overriding {climate} to {self.heat_to_temp}C for {slot.duration // 60} minutes.")
+
+        do_dry_run = self.state_mirror.get(self.helpers.dry_run) == "on"
+        if not do_dry_run:
+            self.call_service("climate/set_temperature", entity_id=climate, temperature=self.heat_to_temp)
+            
+        self.log(f"{'DRY RUN - ' if do_dry_run else ''}{climate}: Setting temperature to {self.heat_to_temp}C")         
+
+        self._journal(self.journal.started, climate, self.get_now_ts(),
+                      to_float(self.state_mirror.get(self.helpers.outdoor_temperature)),
+                      to_float(self.state_mirror.get(climate, attribute="current_temperature")))
+        self._schedule_zone_timer(climate, self.stop_heat_soak, slot.duration)
+        self._watch_zone(climate)
+
+    def _watch_zone(self, climate):
+        """
+        Watch a started zone's temperature for when it reaches heat_to_temp: the thermal
+        model learns from the climb, as the thermostat holds the zone there afterwards.
+        """
+        self._unwatch_zone(climate)
+        self.zone_reached.pop(climate, None)
+        self.zone_watches[climate] = self.listen_state(self.on_zone_temperature, climate, attribute="current_temperature")
+
+    def _unwatch_zone(self, climate):
+        handle = self.zone_watches.pop(climate, None)
+        if handle is not None:
+            self.cancel_listen_state(handle)
+        return handle is not None
+
+    def on_zone_temperature(self, entity, attribute, old, new, kwargs):
+        slot = self.soak_plan.slot(entity) if self.soak_plan else None
+        temp = to_float(new)
+        if slot is None or slot.started_at is None or temp is None or entity in self.zone_reached:
+            return
+        if temp >= self.heat_to_temp - SETPOINT_TOLERANCE:
+            self.zone_reached[entity] = (self.get_now_ts() - slot.started_at, temp)
+            self.log(f"{entity} reached {temp}C after {int(self.zone_reached[entity][0] // 60)} minutes.", level="DEBUG")
+        
+    @timed_method("stop_heat_soak")
+    def stop_heat_soak(self, kwargs):
+        climate = kwargs["climate"]
+        self.zone_timers.pop(climate, None)
+
+        slot = self.soak_plan.slot(climate) if self.soak_plan else None
+        if slot is None:
+            self.log(f"{climate} is not part of the current heat soak, skipping.", level="WARNING")
+            return
+
+        outside_temp = slot.outside_temp
+        start_temp = slot.start_temp
+        current = self.state_mirror.get(climate, attribute="current_temperature")
+        
+        do_dry_run = self.state_mirror.get(self.helpers.dry_run) == "on"
+        if not do_dry_run: 
+            self.call_service("climate/set_temperature", entity_id=climate, temperature=self.restore_temp)
+
+        self.log(f"{'DRY RUN - ' if do_dry_run else ''}{climate}: Restored temperature to {self.restore_temp}C -- Outside: {outside_temp}C | Start: {start_temp}C | End: {current}C")    
+
+        now = self.get_now_ts()
+        #a zone resumed after a restart was not watched, so when it reached heat_to_temp is unknown
+        watched = self._unwatch_zone(climate)
+        reached = self.zone_reached.pop(climate, None)
+        self._journal(self.journal.finished, climate, now, to_float(current))
+        if not do_dry_run and watched and slot.started_at is not None:
+            try:
+                self.thermal_model.record(climate, slot.started_at, now - slot.started_at, outside_temp, start_temp, to_float(current),
+                                          target_temp=self.heat_to_temp, reached=reached, planned_duration=slot.duration)
+            except sqlite3.Error as e:
+                self.log(f"Could not record the soak of {climate} in the thermal model: {e}", level="WARNING")
+        if self.soak_plan.zones:
+            return
+
+        self.log("All climate entities have been processed.")
+        self.soak_plan = None
+        self._journal(self.journal.close, now)
+        
+    def _journal(self, record, *args):
+        """
+        Write to the run journal. The journal's index is also the live plan, so stop_heat_soak
+        and process_next_zone see the change even when the store could not be written.
+        """
+        try:
+            record(*args)
+        except (JournalError, OSError) as e:
+            self.log(f"Could not write the run journal, the soak run will not survive a restart: {e}", level="WARNING")
+
+    def call_service(self, service, **kwargs):
+        """
+        Every Home Assistant service call goes through here so its round-trip is timed.
+        """
+        self.metrics.increment("service_calls")
+        with self.metrics.timed("call_service"):
+            return super().call_service(service, **kwargs)
+
+    def publish_metrics(self, kwargs=None):
+        self.metrics.publish(self)
+
+    def _is_away_mode_enabled(self):
+        """
+        Check if the home/away mode is enabled.
+        """
+        return self.state_mirror.get(self.helpers.away_mode_enabled) == "on"
+    
+    def _is_peak_efficiency_disabled(self):
+        """
+        Check if the peak efficiency is disabled.
+        """
+        return self.state_mirror.get(self.helpers.peak_efficiency_disabled) == "on"
+        
+    def terminate(self):
+        self.state_mirror.terminate()
+        self.thermal_model.history.close()
+        if self.forecast_site is not None:
+            self.forecast_service.unregister(self.forecast_site)
+
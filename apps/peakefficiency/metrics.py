@@ -0,0 +1,122 @@
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+import functools
+import threading
+
+
+DEFAULT_WINDOW = 256  # most recent samples kept per operation
+SENSOR_PREFIX = "sensor.peak_efficiency_"
+
+
+class Histogram:
+    """
+    Rolling window of durations in seconds, plus lifetime count and max.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {"count": self.count}
+        return {
+            "count": self.count,
+            "p50_ms": round(_percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(_percentile(ordered, 95) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class Metrics:
+    """
+    Timings and counters for the app's hot paths. A disabled instance hands out a shared
+    no-op context, so instrumented code costs one attribute check.
+    Notes:
+        - Timings are also recorded from the forecast thread pool, so histograms are
+          created, updated and read under a lock.
+    """
+
+    def __init__(self, enabled=True, window=DEFAULT_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def timed(self, name):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.window)
+            histogram.record(seconds)
+
+    def increment(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        return {
+            "timings": self._timings(),
+            "counters": dict(self.counters),
+        }
+
+    def _timings(self):
+        with self._lock:
+            return {name: h.snapshot() for name, h in self.histograms.items()}
+
+    def publish(self, app, prefix=SENSOR_PREFIX):
+        """
+        Write one sensor per timed operation (state = p95 in ms) and one per counter.
+        """
+        if not self.enabled:
+            return
+        for name, stats in self._timings().items():
+            app.set_state(f"{prefix}{name}", state=stats.get("p95_ms", 0),
+                          attributes={**stats, "unit_of_measurement": "ms", "friendly_name": f"Peak Efficiency {name} p95"})
+        for name, value in self.counters.items():
+            app.set_state(f"{prefix}{name}", state=value,
+                          attributes={"friendly_name": f"Peak Efficiency {name}"})
+
+
+NULL_METRICS = Metrics(enabled=False)
+
+
+def timed_method(name):
+    """
+    Time a method with its instance's `metrics`.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timed(name):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _percentile(ordered, pct):
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
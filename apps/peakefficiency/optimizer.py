@@ -0,0 +1,169 @@
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+import bisect
+import math
+
+
+DEFAULT_STEP_MINUTES = 15
+
+#(outdoor temperature C, COP) points for a typical air-source heat pump, interpolated linearly
+DEFAULT_COP_CURVE = ((-25, 1.5), (-15, 2.0), (-7, 2.5), (2, 3.2), (7, 3.8), (15, 4.5))
+DEFAULT_RADIATION_WEIGHT = 0.01  # score points per W/m2 of shortwave radiation
+
+
+@dataclass
+class Window:
+    start: datetime
+    end: datetime
+    score: float  # mean per-sample score over the window
+
+
+# Score functions take a ForecastSeries and return one score per sample, higher is better.
+
+def temperature_score(series):
+    return series.column("temperature_2m")
+
+
+def cop_curve(curve=DEFAULT_COP_CURVE):
+    """
+    COP as a function of outdoor temperature, interpolated linearly on curve.
+    """
+    temps = [t for t, _ in curve]
+    cops = [c for _, c in curve]
+
+    def cop(temp):
+        if temp != temp:
+            return math.nan
+        i = bisect.bisect_left(temps, temp)
+        if i == 0:
+            return cops[0]
+        if i == len(temps):
+            return cops[-1]
+        t0, t1 = temps[i - 1], temps[i]
+        return cops[i - 1] + (cops[i] - cops[i - 1]) * (temp - t0) / (t1 - t0)
+    return cop
+
+
+def cop_score(curve=DEFAULT_COP_CURVE):
+    cop = cop_curve(curve)
+
+    def score(series):
+        return array("d", map(cop, series.column("temperature_2m")))
+    return score
+
+
+def radiation_bonus(base=temperature_score, weight=DEFAULT_RADIATION_WEIGHT):
+    def score(series):
+        radiation = series.column("shortwave_radiation")
+        return array("d", (s + weight * r for s, r in zip(base(series), radiation)))
+    return score
+
+
+SCORES = {
+    "temperature": temperature_score,
+    "cop": cop_score(),
+    "radiation": radiation_bonus(),
+}
+
+
+class WindowOptimizer:
+    """
+    Finds the best soak windows in a forecast. The forecast is resampled once onto a
+    step_minutes grid; each query then costs one prefix-sum pass, so many scoring
+    variants and long horizons stay O(n).
+    """
+
+    def __init__(self, series, step_minutes=DEFAULT_STEP_MINUTES):
+        self.series = series.resample(step_minutes)
+        self.step_minutes = step_minutes
+
+    def best_windows(self, minutes, score=temperature_score, top_n=1, now=None, today_only=False, finish_by=None):
+        """
+        Return up to top_n non-overlapping windows of the given length, best first.
+        Args:
+            minutes (int): Window length in minutes, rounded up to the grid step.
+            score (callable): Per-sample score function, see SCORES.
+            top_n (int): Number of windows to return.
+            now (datetime): Naive local datetime; windows may not start before it.
+            today_only (bool): Only windows starting on the same day as now.
+            finish_by (datetime): Naive local datetime the window must end by.
+        Raises:
+            ValueError: If the forecast is shorter than the requested window.
+        """
+        size, means = self.window_means(minutes, score)
+        return self.best_of(size, means, top_n, now, today_only, finish_by)
+
+    def best_of(self, size, means, top_n=1, now=None, today_only=False, finish_by=None):
+        """
+        best_windows over means already computed by window_means, so callers asking many
+        questions of one forecast (the backtest plans every day of a season) pay for the
+        prefix-sum pass once. Arguments as for best_windows.
+        """
+        series = self.series
+        first, last = 0, len(series) - size
+        if now is not None:
+            first = bisect.bisect_left(series.times, series.local_epoch(now))
+            if today_only:
+                last = min(last, bisect.bisect_right(series.local_days, now.toordinal()) - 1)
+        if finish_by is not None:
+            #a window starting at index i ends at times[i] + size steps
+            limit = series.local_epoch(finish_by) - size * self.step_minutes * 60
+            last = min(last, bisect.bisect_right(series.times, limit) - 1)
+
+        candidates = [(means[i], i) for i in range(first, last + 1) if means[i] == means[i]]
+        #best score first, earliest start on ties
+        candidates.sort(key=lambda c: (-c[0], c[1]))
+
+        chosen = []
+        for mean, i in candidates:
+            if len(chosen) == top_n:
+                break
+            if all(abs(i - j) >= size for _, j in chosen):
+                chosen.append((mean, i))
+
+        step = self.step_minutes * 60
+        return [
+            Window(start=series.to_local_datetime(series.times[i]),
+                   end=series.to_local_datetime(series.times[i] + size * step),
+                   score=mean)
+            for mean, i in chosen
+        ]
+
+    def window_means(self, minutes, score=temperature_score):
+        """
+        Mean score of the window starting at every sample, NaN where the window runs off
+        the end of the forecast or covers a missing value. One prefix-sum pass.
+        Returns:
+            tuple: (window size in samples, array of means indexed by start sample)
+        Raises:
+            ValueError: If the forecast is shorter than the requested window.
+        """
+        series = self.series
+        size = math.ceil(minutes / self.step_minutes)
+        if len(series) < size:
+            raise ValueError("Forecast data too short for the requested window")
+
+        scores = score(series)
+        sums = prefix_sums(scores)
+        missing = prefix_sums(array("d", (s != s for s in scores)))
+
+        n = len(series)
+        means = array("d", (
+            (sums[i + size] - sums[i]) / size if i + size <= n and missing[i + size] == missing[i] else math.nan
+            for i in range(n)
+        ))
+        return size, means
+
+
+def prefix_sums(values):
+    """
+    Prefix sums with a leading zero; NaNs count as zero (they are tracked separately).
+    """
+    out = array("d", [0.0])
+    total = 0.0
+    for v in values:
+        if v == v:
+            total += v
+        out.append(total)
+    return out
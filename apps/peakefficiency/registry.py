@@ -0,0 +1,109 @@
+from dataclasses import dataclass, fields
+
+
+DEFAULT_PRIORITY = 0  # lower priorities are packed first
+
+#home assistant helpers, overridable under `helpers:` in the app config
+MANUAL_START = "input_boolean.start_peak_efficiency"
+DRY_RUN = "input_boolean.peak_efficiency_dry_run"
+OUTDOOR_TEMPERATURE_SENSOR = "sensor.condenser_temperature_sensor_temperature"
+AWAY_TARGET_TEMP = "input_number.away_mode_target_temperature"
+AWAY_PEAK_HEAT_TO_TEMP = "input_number.away_mode_peak_heat_to_tempearture"
+AWAY_MODE_ENABLED = "input_boolean.home_away_mode_enabled"
+PEAK_EFFICIENCY_DISABLED = "input_boolean.peak_efficiency_disabled"
+
+#zones used when the app config has no `zones:` section, durations in minutes
+DEFAULT_ZONES = {
+    "climate.main_floor": {"duration": 40},
+    "climate.master_bedroom": {"duration": 20},
+    "climate.basement_master": {"duration": 20},
+    "climate.basement_bunk_rooms": {"duration": 30},
+    "climate.ski_room": {"duration": 10},
+}
+
+
+@dataclass(frozen=True)
+class Helpers:
+    manual_start: str = MANUAL_START
+    dry_run: str = DRY_RUN
+    outdoor_temperature: str = OUTDOOR_TEMPERATURE_SENSOR
+    away_target_temp: str = AWAY_TARGET_TEMP
+    away_peak_heat_to_temp: str = AWAY_PEAK_HEAT_TO_TEMP
+    away_mode_enabled: str = AWAY_MODE_ENABLED
+    peak_efficiency_disabled: str = PEAK_EFFICIENCY_DISABLED
+
+    @classmethod
+    def from_config(cls, config):
+        config = config or {}
+        unknown = set(config) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown helpers: {', '.join(sorted(unknown))}")
+        return cls(**config)
+
+    def entities(self):
+        return tuple(getattr(self, f.name) for f in fields(self))
+
+
+@dataclass(frozen=True)
+class Zone:
+    climate: str
+    duration: int  # seconds
+    priority: int = DEFAULT_PRIORITY
+    group: str = None  # e.g. a floor or a site
+    power_kw: float = None
+
+
+class ZoneRegistry:
+    """
+    The zones the app manages, in priority order (configured order within a priority),
+    with O(1) lookup by entity id and by group.
+    """
+
+    def __init__(self, zones):
+        self.zones = sorted(zones, key=lambda z: z.priority)
+        self._by_id = {z.climate: z for z in self.zones}
+        if len(self._by_id) != len(self.zones):
+            raise ValueError("A climate entity is listed more than once in zones.")
+        self.groups = {}
+        for zone in self.zones:
+            self.groups.setdefault(zone.group, []).append(zone)
+
+    @classmethod
+    def from_config(cls, config, default_duration):
+        """
+        Build from the app's `zones:` mapping of climate entity -> options:
+            duration: minutes (default_duration seconds when omitted)
+            priority: lower values start first
+            group: name of a floor, site or other grouping
+            power_kw: electrical load while heating, for power_budget_kw
+        """
+        zones = []
+        for climate, options in (config or DEFAULT_ZONES).items():
+            options = options or {}
+            duration = options.get("duration")
+            zones.append(Zone(
+                climate=climate,
+                duration=int(duration * 60) if duration is not None else default_duration,
+                priority=options.get("priority", DEFAULT_PRIORITY),
+                group=options.get("group"),
+                power_kw=options.get("power_kw"),
+            ))
+        return cls(zones)
+
+    def __len__(self):
+        return len(self.zones)
+
+    def __iter__(self):
+        return iter(self.zones)
+
+    def __contains__(self, climate):
+        return climate in self._by_id
+
+    def get(self, climate):
+        return self._by_id.get(climate)
+
+    def ids(self):
+        return [z.climate for z in self.zones]
+
+    def group(self, name):
+        return self.groups.get(name, [])
@@ -0,0 +1,165 @@
+from dataclasses import dataclass, field
+from datetime import date, time
+import bisect
+import heapq
+import json
+import os
+
+
+DAILY_SCHEDULE_SOAK_RUN = time(8, 0, 0)  # figure out what time to run the soak run
+DEFAULT_RUN_AT_TIME = time(15, 0, 0)  # Default run time is 3 PM
+
+
+@dataclass
+class ZoneSlot:
+    climate: str
+    offset: int  # seconds after the soak starts
+    duration: int  # seconds
+    started: bool = False
+    outside_temp: float = None  # recorded when the zone starts
+    start_temp: float = None
+    started_at: float = None  # epoch seconds the zone actually started
+    finished_at: float = None  # epoch seconds the zone was restored
+    end_temp: float = None
+
+    @property
+    def end(self):
+        return self.offset + self.duration
+
+
+@dataclass
+class SoakPlan:
+    started_at: float  # epoch seconds
+    zones: list = field(default_factory=list)  # ZoneSlot, ordered by offset
+
+    def __post_init__(self):
+        self._by_climate = {s.climate: s for s in self.zones}
+
+    def slot(self, climate):
+        return self._by_climate.get(climate)
+
+    def remove(self, climate):
+        slot = self._by_climate.pop(climate, None)
+        if slot is not None:
+            self.zones.remove(slot)
+        return slot
+
+
+@dataclass
+class DailySchedule:
+    """
+    When today's soak run starts and the zone order it was planned with.
+    """
+    run_at: time
+    zones: list = field(default_factory=list)  # climate entities in start order
+    planned_at: float = None  # epoch seconds
+    ran_on: date = None  # local date the scheduled soak last started
+
+    def same_as(self, other):
+        return other is not None and self.run_at == other.run_at and self.zones == other.zones
+
+    def save(self, path):
+        """
+        Write atomically, so a restart mid-write finds the previous schedule intact.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"run_at": self.run_at.isoformat(), "zones": self.zones, "planned_at": self.planned_at,
+                       "ran_on": self.ran_on.isoformat() if self.ran_on else None}, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        """
+        The saved schedule, or None if there is none or it cannot be read.
+        """
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            ran_on = data.get("ran_on")
+            return DailySchedule(run_at=time.fromisoformat(data["run_at"]), zones=list(data["zones"]),
+                                 planned_at=data.get("planned_at"), ran_on=date.fromisoformat(ran_on) if ran_on else None)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+
+def pack_zones(durations, max_concurrent=1, power_kw=None, power_budget_kw=None, longest_first=True, priority=None):
+    """
+    Pack zones into as short a soak as the budget allows.
+    Args:
+        durations (dict): climate entity -> soak duration in seconds.
+        max_concurrent (int): Most zones heating at the same time.
+        power_kw (dict): Optional climate entity -> electrical load in kW.
+        power_budget_kw (float): Optional cap on the summed load of running zones.
+        longest_first (bool): Place zones longest first; otherwise in the given order.
+        priority (dict): Optional climate entity -> priority; lower priorities are placed
+            first, ahead of the longest-first ordering.
+    Returns:
+        list: ZoneSlots ordered by start offset.
+    Notes:
+        - Longest zones are placed first (LPT), each at the earliest time it fits,
+          which keeps the makespan close to total duration / max_concurrent.
+        - Without a power budget the earliest fit is always when the first of
+          max_concurrent lanes frees up, so placement is a heap pop: O(n log n).
+        - A zone whose own load exceeds the budget still runs, but on its own.
+    """
+    power_kw = power_kw or {}
+    priority = priority or {}
+
+    #stable sort keeps the configured order for zones of equal priority and length
+    if longest_first:
+        order = sorted(durations, key=lambda c: (priority.get(c, 0), -durations[c]))
+    else:
+        order = sorted(durations, key=lambda c: priority.get(c, 0))
+
+    if power_budget_kw is None:
+        placed = _pack_lanes(order, durations, max_concurrent)
+    else:
+        placed = _pack_budget(order, durations, max_concurrent, power_kw, power_budget_kw)
+    return sorted(placed, key=lambda s: s.offset)
+
+
+def makespan(slots):
+    return max((s.end for s in slots), default=0)
+
+
+def _pack_lanes(order, durations, max_concurrent):
+    lanes = [0] * max(1, max_concurrent)  # heap of the times each lane frees up
+    placed = []
+    for climate in order:
+        start = lanes[0]
+        heapq.heapreplace(lanes, start + durations[climate])
+        placed.append(ZoneSlot(climate=climate, offset=start, duration=durations[climate]))
+    return placed
+
+
+def _pack_budget(order, durations, max_concurrent, power_kw, power_budget_kw):
+    placed = []
+    starts = [0]  # sorted candidate start times: 0 and every placed zone's end
+    for climate in order:
+        duration = durations[climate]
+        for start in starts:
+            if _fits(placed, start, duration, climate, max_concurrent, power_kw, power_budget_kw):
+                break
+        slot = ZoneSlot(climate=climate, offset=start, duration=duration)
+        placed.append(slot)
+        i = bisect.bisect_left(starts, slot.end)
+        if i == len(starts) or starts[i] != slot.end:
+            starts.insert(i, slot.end)
+    return placed
+
+
+def _fits(placed, start, duration, climate, max_concurrent, power_kw, power_budget_kw):
+    end = start + duration
+    overlapping = [s for s in placed if s.offset < end and start < s.end]
+
+    #load only changes where another zone starts, so checking those points is enough
+    for point in {start, *(s.offset for s in overlapping if s.offset > start)}:
+        running = [s for s in overlapping if s.offset <= point < s.end]
+        if len(running) >= max_concurrent:
+            return False
+        if power_budget_kw is not None and running:
+            load = sum(power_kw.get(s.climate, 0) for s in running) + power_kw.get(climate, 0)
+            if load > power_budget_kw:
+                return False
+    return True
@@ -0,0 +1,272 @@
+from array import array
+from collections import deque
+from datetime import datetime, timedelta, timezone
+import bisect
+import math
+import time
+
+
+DEFAULT_BUFFER_HOURS = 16 * 24  # Open-Meteo's longest hourly forecast horizon
+DEFAULT_REVISIONS = 8  # past forecasts kept per hour
+
+
+class ForecastSeries:
+    """
+    Column-oriented hourly forecast. Timestamps are parsed once into UTC epoch seconds
+    plus local hour-of-day and day ordinal columns; every variable lives in an array('d')
+    buffer with NaN for missing values and a matching array('b') validity mask.
+    """
+
+    def __init__(self, times, utc_offset, columns):
+        self.times = times
+        self.utc_offset = utc_offset
+        self.columns = columns
+        self.masks = {name: array("b", (v == v for v in values)) for name, values in columns.items()}
+
+        local = [datetime.fromtimestamp(t + utc_offset, timezone.utc) for t in times]
+        self.local_hours = array("b", (dt.hour for dt in local))
+        self.local_days = array("l", (dt.toordinal() for dt in local))
+
+    @classmethod
+    def from_open_meteo(cls, data, variables, hours=None):
+        """
+        Build a series from an Open-Meteo response requested with timezone=auto, whose
+        hourly times are local wall-clock ISO strings.
+        """
+        hourly = data["hourly"]
+        utc_offset = data.get("utc_offset_seconds", 0)
+        raw_times = hourly["time"][:hours]
+
+        times = array("d", (
+            datetime.fromisoformat(t).replace(tzinfo=timezone.utc).timestamp() - utc_offset for t in raw_times
+        ))
+        columns = {
+            name: array("d", (math.nan if v is None else v for v in hourly[name][:len(times)]))
+            for name in variables
+        }
+        return cls(times, utc_offset, columns)
+
+    @classmethod
+    def empty(cls, variables):
+        return cls(array("d"), 0, {name: array("d") for name in variables})
+
+    def __len__(self):
+        return len(self.times)
+
+    def column(self, name):
+        return self.columns[name]
+
+    def mask(self, name):
+        return self.masks[name]
+
+    def local_datetime(self, index):
+        """
+        Naive local datetime of a row, matching what datetime.now() returns on the AppDaemon host.
+        """
+        return self.to_local_datetime(self.times[index])
+
+    def to_local_datetime(self, epoch):
+        return datetime(1970, 1, 1) + timedelta(seconds=epoch + self.utc_offset)
+
+    def local_epoch(self, local_dt):
+        """
+        Epoch seconds of a naive local datetime (e.g. datetime.now()) on this series' clock.
+        """
+        return local_dt.replace(tzinfo=timezone.utc).timestamp() - self.utc_offset
+
+    def resample(self, step_minutes):
+        """
+        Linearly interpolate every column onto a regular step_minutes grid. A sample
+        between a valid and a missing hour comes out as NaN, so it stays masked.
+        """
+        step = step_minutes * 60
+        times = self.times
+        if len(times) < 2:
+            return self
+
+        n = int((times[-1] - times[0]) // step) + 1
+        new_times = array("d", (times[0] + i * step for i in range(n)))
+
+        #for each new sample, the index of the source sample at or before it
+        left = array("l")
+        j = 0
+        for t in new_times:
+            while j + 2 < len(times) and times[j + 1] <= t:
+                j += 1
+            left.append(j)
+
+        columns = {}
+        for name, values in self.columns.items():
+            out = array("d")
+            for t, j in zip(new_times, left):
+                a, b = values[j], values[min(j + 1, len(values) - 1)]
+                frac = (t - times[j]) / (times[j + 1] - times[j])
+                out.append(a if frac == 0 else a + (b - a) * frac)
+            columns[name] = out
+        return ForecastSeries(new_times, self.utc_offset, columns)
+
+    def values_between(self, name, start_epoch, end_epoch):
+        """
+        Valid values of a column from the sample at or before start_epoch through end_epoch.
+        """
+        first = max(0, bisect.bisect_right(self.times, start_epoch) - 1)
+        last = bisect.bisect_right(self.times, end_epoch)
+        values, mask = self.columns[name], self.masks[name]
+        return array("d", (values[i] for i in range(first, last) if mask[i]))
+
+    def value_at(self, name, epoch):
+        """
+        A column linearly interpolated at epoch; NaN outside the series or next to a missing value.
+        """
+        times, values = self.times, self.columns[name]
+        i = bisect.bisect_right(times, epoch) - 1
+        if i < 0 or (i == len(times) - 1 and times[i] != epoch):
+            return math.nan
+        if times[i] == epoch:
+            return values[i]
+        frac = (epoch - times[i]) / (times[i + 1] - times[i])
+        return values[i] + (values[i + 1] - values[i]) * frac
+
+    def rows(self, *names):
+        """
+        Yield (local datetime, value, ...) tuples, for logging.
+        """
+        names = names or tuple(self.columns)
+        cols = [self.columns[n] for n in names]
+        for i in range(len(self.times)):
+            yield (self.local_datetime(i), *(c[i] for c in cols))
+
+
+class ForecastBuffer:
+    """
+    Rolling hourly forecast for one site, indexed by UTC hour number (epoch // 3600).
+    Each fetch is merged in: hours it covers are overwritten, hours that have passed are
+    dropped, and every change to a tracked variable is kept as a revision of that hour.
+    Values live in a fixed ring of capacity slots (slot = hour % capacity), so merges and
+    lookups are O(1) per hour and memory does not grow with uptime.
+    """
+
+    def __init__(self, variables, capacity=DEFAULT_BUFFER_HOURS, track=("temperature_2m",), revisions=DEFAULT_REVISIONS):
+        self.variables = tuple(variables)
+        self.capacity = capacity
+        self.utc_offset = 0
+        self.hours = array("q", [-1]) * capacity  # hour held by each slot, -1 when empty
+        self.columns = {name: array("d", [math.nan]) * capacity for name in self.variables}
+        self.track = tuple(name for name in track if name in self.variables)
+        self.max_revisions = revisions
+        self.revisions = {}  # hour -> deque of (fetched_at, tracked values)
+        self.first_hour = None
+        self.last_hour = None
+
+    def __len__(self):
+        return sum(h >= 0 for h in self.hours)
+
+    def merge(self, data, fetched_at=None):
+        """
+        Merge an Open-Meteo response (timezone=auto). A missing value in the response
+        keeps whatever the buffer already had for that hour.
+        Returns:
+            int: The number of hours whose tracked values changed.
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        hourly = data["hourly"]
+        self.utc_offset = data.get("utc_offset_seconds", self.utc_offset)
+        incoming = [(name, hourly[name]) for name in self.variables if name in hourly]
+        changed = 0
+
+        for i, t in enumerate(hourly["time"]):
+            epoch = datetime.fromisoformat(t).replace(tzinfo=timezone.utc).timestamp() - self.utc_offset
+            hour = int(epoch // 3600)
+            slot = hour % self.capacity
+            if self.hours[slot] != hour:
+                self._clear(slot)
+                self.hours[slot] = hour
+                self.first_hour = hour if self.first_hour is None else min(self.first_hour, hour)
+                self.last_hour = hour if self.last_hour is None else max(self.last_hour, hour)
+
+            for name, values in incoming:
+                value = values[i] if i < len(values) else None
+                if value is not None:
+                    self.columns[name][slot] = value
+
+            if self.track:
+                tracked = tuple(self.columns[name][slot] for name in self.track)
+                history = self.revisions.get(hour)
+                if history is None:
+                    history = self.revisions[hour] = deque(maxlen=self.max_revisions)
+                if not history or history[-1][1] != tracked:
+                    history.append((fetched_at, tracked))
+                    changed += len(history) > 1
+        return changed
+
+    def drop_before(self, now=None):
+        """
+        Forget every hour before the one containing now.
+        """
+        now = time.time() if now is None else now
+        cutoff = int(now // 3600)
+        if self.first_hour is None or self.first_hour >= cutoff:
+            return
+        for hour in range(self.first_hour, min(cutoff, self.first_hour + self.capacity)):
+            slot = hour % self.capacity
+            if self.hours[slot] == hour:
+                self._clear(slot)
+        for hour in [h for h in self.revisions if h < cutoff]:
+            del self.revisions[hour]
+        if self.last_hour < cutoff:
+            self.first_hour = self.last_hour = None
+        else:
+            self.first_hour = cutoff
+
+    def covered_hours(self, now=None):
+        """
+        Number of consecutive hours held, starting with the one containing now.
+        """
+        now = time.time() if now is None else now
+        hour = int(now // 3600)
+        count = 0
+        while count < self.capacity and self.hours[(hour + count) % self.capacity] == hour + count:
+            count += 1
+        return count
+
+    def hours_needed(self, horizon, refresh_hours, slack, now=None):
+        """
+        How many hours ahead the next fetch should ask for: only the near term while the
+        buffer still reaches to within slack hours of the horizon, the full horizon otherwise.
+        """
+        if self.covered_hours(now) < horizon - slack:
+            return horizon
+        return min(horizon, refresh_hours)
+
+    def history(self, epoch):
+        """
+        Every forecast recorded for the hour containing epoch, oldest first, as
+        (fetched_at, {variable: value}) pairs.
+        """
+        return [(fetched_at, dict(zip(self.track, values)))
+                for fetched_at, values in self.revisions.get(int(epoch // 3600), ())]
+
+    def to_payload(self, hours, now=None):
+        """
+        The buffered hours from now on, at most `hours` of them, shaped like an Open-Meteo
+        response so it can be cached and parsed with ForecastSeries.from_open_meteo.
+        """
+        now = time.time() if now is None else now
+        first = int(now // 3600)
+        times = []
+        hourly = {name: [] for name in self.variables}
+        for hour in range(first, first + min(hours, self.capacity)):
+            slot = hour % self.capacity
+            if self.hours[slot] != hour:
+                continue
+            local = datetime(1970, 1, 1) + timedelta(seconds=hour * 3600 + self.utc_offset)
+            times.append(local.strftime("%Y-%m-%dT%H:%M"))
+            for name, values in hourly.items():
+                value = self.columns[name][slot]
+                values.append(value if value == value else None)
+        return {"utc_offset_seconds": self.utc_offset, "hourly": {"time": times, **hourly}}
+
+    def _clear(self, slot):
+        self.hours[slot] = -1
+        for values in self.columns.values():
+            values[slot] = math.nan
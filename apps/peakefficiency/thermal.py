@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+import math
+import sqlite3
+import threading
+
+
+MIN_SAMPLES = 5  # soaks a zone needs before its learned duration is used
+DEFAULT_MIN_DURATION = 5 * 60  # seconds
+DEFAULT_MAX_DURATION = 2 * 60 * 60  # seconds
+DURATION_STEP = 5 * 60  # learned durations are rounded up to this many seconds
+MIN_RECORDED_DURATION = 60  # shorter soaks (e.g. restored right after a restart) say nothing about the rate
+MAX_RESTORE_DELAY = 60  # soaks restored later than planned (e.g. after a restart) held the set-point for part of the time
+SETPOINT_TOLERANCE = 0.2  # C below the set-point that counts as having reached it; thermostats report in coarse steps
+
+
+@dataclass
+class ZoneFit:
+    """
+    Least-squares fit of a zone's heating rate (C per hour) against the outdoor
+    temperature, kept as running sums so a new soak is folded in with O(1) work.
+    """
+    n: int = 0
+    sx: float = 0.0
+    sy: float = 0.0
+    sxx: float = 0.0
+    sxy: float = 0.0
+
+    def add(self, outside_temp, rate):
+        self.n += 1
+        self.sx += outside_temp
+        self.sy += rate
+        self.sxx += outside_temp * outside_temp
+        self.sxy += outside_temp * rate
+
+    def coefficients(self):
+        """
+        (intercept, slope) of rate = intercept + slope * outside_temp. With no spread in
+        outdoor temperatures the slope is 0 and the intercept is the mean rate.
+        """
+        if not self.n:
+            return None
+        spread = self.n * self.sxx - self.sx * self.sx
+        if spread <= 1e-9 * self.n * self.n:
+            return self.sy / self.n, 0.0
+        slope = (self.n * self.sxy - self.sx * self.sy) / spread
+        return (self.sy - slope * self.sx) / self.n, slope
+
+    def rate(self, outside_temp):
+        intercept, slope = self.coefficients()
+        return intercept + slope * outside_temp
+
+
+class SoakHistory:
+    """
+    Every finished soak in a local SQLite file, indexed by (zone, started_at) so a zone's
+    history, or the fit over a date range, is an index scan even after years of runs.
+    A row covers the soak's climb: its duration and end_temp stop where it reached the
+    set-point, if it did.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS soaks ("
+                " zone TEXT NOT NULL, started_at REAL NOT NULL, duration REAL NOT NULL,"
+                " outside_temp REAL NOT NULL, start_temp REAL NOT NULL, end_temp REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS soaks_zone_time ON soaks (zone, started_at)")
+
+    def record(self, zone, started_at, duration, outside_temp, start_temp, end_temp):
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO soaks VALUES (?, ?, ?, ?, ?, ?)",
+                             (zone, started_at, duration, outside_temp, start_temp, end_temp))
+
+    def soaks(self, zone, since=None, until=None):
+        """
+        (started_at, duration, outside_temp, start_temp, end_temp) rows of one zone, oldest first.
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT started_at, duration, outside_temp, start_temp, end_temp FROM soaks"
+                " WHERE zone = ? AND started_at >= ? AND started_at < ? ORDER BY started_at",
+                (zone, -math.inf if since is None else since, math.inf if until is None else until),
+            ).fetchall()
+
+    def fits(self, since=None):
+        """
+        A ZoneFit per zone, summed in SQL over the soaks started since `since`.
+        """
+        rate = "((end_temp - start_temp) * 3600.0 / duration)"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT zone, COUNT(*), SUM(outside_temp), SUM({rate}), SUM(outside_temp * outside_temp),"
+                f" SUM(outside_temp * {rate}) FROM soaks WHERE started_at >= ? AND duration > 0 GROUP BY zone",
+                (-math.inf if since is None else since,),
+            ).fetchall()
+        return {zone: ZoneFit(*sums) for zone, *sums in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ThermalModel:
+    """
+    Learned heating rate per zone, used to size each zone's soak for the outdoor
+    temperature it will run in.
+    """
+
+    def __init__(self, history, min_samples=MIN_SAMPLES, min_duration=DEFAULT_MIN_DURATION,
+                 max_duration=DEFAULT_MAX_DURATION):
+        self.history = history
+        self.min_samples = min_samples
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.fits = history.fits()
+
+    def record(self, zone, started_at, duration, outside_temp, start_temp, end_temp, target_temp=None, reached=None,
+               planned_duration=None):
+        """
+        Store a finished soak and fold it into the zone's fit.
+        Args:
+            duration (float): Seconds the zone was held at the peak set-point.
+            target_temp (float): The peak set-point.
+            reached (tuple): (seconds after the start, temperature) when the zone was seen
+                reaching target_temp, or None.
+            planned_duration (float): Seconds the soak was planned to run.
+        Notes:
+            - Once a zone reaches the set-point the thermostat holds it there, so only the
+              climb says how fast it heats: a soak that reached it is stored as that climb,
+              and one that ended at the set-point without its reach being seen is skipped.
+            - Soaks restored well past planned_duration (e.g. after a restart) are skipped.
+        """
+        if planned_duration is not None and duration > planned_duration + MAX_RESTORE_DELAY:
+            return
+        if reached is not None:
+            duration, end_temp = reached
+        elif None not in (target_temp, end_temp) and end_temp >= target_temp - SETPOINT_TOLERANCE:
+            return
+        if duration < MIN_RECORDED_DURATION or None in (outside_temp, start_temp, end_temp):
+            return
+        self.history.record(zone, started_at, duration, outside_temp, start_temp, end_temp)
+        self.fits.setdefault(zone, ZoneFit()).add(outside_temp, (end_temp - start_temp) * 3600 / duration)
+
+    def duration(self, zone, outside_temp, start_temp, target_temp, default):
+        """
+        Seconds the zone needs to climb from start_temp to target_temp at outside_temp,
+        capped at default (the zone's configured duration), so learning only shortens a
+        soak. default while the zone has too few soaks or the fit predicts no heating.
+        """
+        fit = self.fits.get(zone)
+        if fit is None or fit.n < self.min_samples or None in (outside_temp, start_temp):
+            return default
+        rate = fit.rate(outside_temp)
+        if rate <= 0:
+            return default
+        seconds = max(0.0, target_temp - start_temp) / rate * 3600
+        seconds = math.ceil(seconds / DURATION_STEP) * DURATION_STEP
+        return int(min(default, self.max_duration, max(self.min_duration, seconds)))
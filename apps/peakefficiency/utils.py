@@ -1,29 +1,86 @@
-class HelperUtils:
-    def __init__(self, app):
-        self.app  = app
-        
-    def safe_get_float(self, entity_id, default):
-        try:
-            return float(self.app.get_state(entity_id))
-        except (TypeError, ValueError):
-            self.app.log(f"Could not read {entity_id}, using default {default}", level="WARNING")
-            return default
-        
-    def assert_entity_exists(self, entity_id, friendly_name=None, required=True):
-        """
-        Check if an entity exists in Home Assistant. If it doesn't, log an error and raise a ValueError.
-        :param entity_id: The entity ID to check.
-        :param friendly_name: Optional friendly name for logging.
-        :param required: If True, raise an error if the entity does not exist.
-        """
-        entity_state = self.app.get_state(entity_id)
-        
-        if entity_state is not None:
-            return
-        
-        if required:
-            friendly_name = friendly_name or entity_id
-            self.app.error(f"Entity {friendly_name} ({entity_id}) does not exist in Home Assistant.")
-            raise ValueError(f"Entity {friendly_name} ({entity_id}) does not exist in Home Assistant.")
-        else:
+def to_float(value, default=None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class StateMirror:
+    """
+    Local copy of Home Assistant entity states. Filled by a single bulk get_state() and
+    kept current by listen_state callbacks, so reads never go back to Home Assistant.
+    """
+
+    def __init__(self, app, entity_ids):
+        self.app = app
+        self.entity_ids = list(dict.fromkeys(entity_ids))
+        self._states = {}  # entity_id -> {"state": ..., "attributes": {...}} or None if missing
+        self._handles = {}
+
+    def load(self):
+        everything = self.app.get_state() or {}
+        for entity_id in self.entity_ids:
+            self._states[entity_id] = everything.get(entity_id)
+            self._listen(entity_id)
+
+    def _listen(self, entity_id):
+        if entity_id not in self._handles:
+            self._handles[entity_id] = self.app.listen_state(self._on_change, entity_id, attribute="all")
+
+    def _on_change(self, entity, attribute, old, new, kwargs):
+        self._states[entity] = new
+
+    def get(self, entity_id, attribute=None):
+        """
+        Same contract as Hass.get_state for a single entity: the state, or one attribute.
+        """
+        entry = self._states.get(entity_id)
+        if entry is None:
+            return None
+        if attribute is None:
+            return entry.get("state")
+        if attribute == "all":
+            return entry
+        return (entry.get("attributes") or {}).get(attribute)
+
+    def terminate(self):
+        for handle in self._handles.values():
+            self.app.cancel_listen_state(handle)
+        self._handles = {}
+
+
+class HelperUtils:
+    def __init__(self, app, mirror=None):
+        self.app  = app
+        self.mirror = mirror
+
+    def _get_state(self, entity_id):
+        if self.mirror is not None:
+            return self.mirror.get(entity_id)
+        return self.app.get_state(entity_id)
+        
+    def safe_get_float(self, entity_id, default):
+        try:
+            return float(self._get_state(entity_id))
+        except (TypeError, ValueError):
+            self.app.log(f"Could not read {entity_id}, using default {default}", level="WARNING")
+            return default
+        
+    def assert_entity_exists(self, entity_id, friendly_name=None, required=True):
+        """
+        Check if an entity exists in Home Assistant. If it doesn't, log an error and raise a ValueError.
+        :param entity_id: The entity ID to check.
+        :param friendly_name: Optional friendly name for logging.
+        :param required: If True, raise an error if the entity does not exist.
+        """
+        entity_state = self._get_state(entity_id)
+        
+        if entity_state is not None:
+            return
+        
+        if required:
+            friendly_name = friendly_name or entity_id
+            self.app.error(f"Entity {friendly_name} ({entity_id}) does not exist in Home Assistant.")
+            raise ValueError(f"Entity {friendly_name} ({entity_id}) does not exist in Home Assistant.")
+        else:
             self.app.log(f"Entity {friendly_name} ({entity_id}) does not exist in Home Assistant. Proceeding without it.", level="WARNING")
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Offline benchmarks for the PeakEfficiency app, run against FakeHass and a local
+Open-Meteo stub:
+
+    python benchmarks/bench.py [--iterations N] [--hours 48,168,384] [--zones 5,50,200]
+
+Prints throughput and latency percentiles (ms) per operation and size.
+"""
+from time import perf_counter
+import argparse
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "apps", "peakefficiency"))
+
+import fakehass
+fakehass.install()
+
+from openmeteo_stub import OpenMeteoStub
+import forecast
+import main
+import registry
+
+
+LATITUDE = 50.88
+LONGITUDE = -119.90
+
+
+def percentile(sorted_samples, pct):
+    index = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    total = sum(samples)
+    ms = [percentile(samples, p) * 1000 for p in (50, 95, 99)]
+    print(f"{name:<48} n={len(samples):<5} {len(samples) / total:>10.1f} ops/s  "
+          f"p50={ms[0]:8.3f}  p95={ms[1]:8.3f}  p99={ms[2]:8.3f}  max={samples[-1] * 1000:8.3f}")
+
+
+def measure(fn, iterations, setup=None):
+    samples = []
+    for _ in range(iterations):
+        arg = setup() if setup else None
+        start = perf_counter()
+        fn(arg)
+        samples.append(perf_counter() - start)
+    return samples
+
+
+def zone_ids(count):
+    return [f"climate.zone_{i:03d}" for i in range(count)]
+
+
+def make_app(stub, cache_file, zones):
+    states = {e: {"state": "heat", "attributes": {"current_temperature": 13.0}} for e in zones}
+    states.update({
+        registry.AWAY_MODE_ENABLED: {"state": "on"},
+        registry.PEAK_EFFICIENCY_DISABLED: {"state": "off"},
+        registry.DRY_RUN: {"state": "off"},
+        registry.OUTDOOR_TEMPERATURE_SENSOR: {"state": "-4.0"},
+        registry.AWAY_TARGET_TEMP: {"state": "13"},
+        registry.AWAY_PEAK_HEAT_TO_TEMP: {"state": "19.5"},
+    })
+    args = {
+        "latitude": LATITUDE,
+        "longitude": LONGITUDE,
+        "forecast_url": stub.url,
+        "forecast_cache_file": cache_file,
+        "schedule_file": os.path.join(os.path.dirname(cache_file), "schedule.json"),
+        "soak_history_file": os.path.join(os.path.dirname(cache_file), "soaks.sqlite"),
+        "journal_file": os.path.join(os.path.dirname(cache_file), "journal.log"),
+        "max_concurrent_zones": 2,
+        "zones": {z: {"duration": 10 + 10 * (i % 4), "group": f"floor_{i % 3}"} for i, z in enumerate(zones)},
+    }
+    return main.PeakEfficiency(args=args, states=states)
+
+
+def bench_app(stub, iterations, zone_counts, tmp):
+    cache_file = os.path.join(tmp, "forecast_cache.json")
+
+    #prime the shared cache so the warm numbers exclude the network
+    make_app(stub, cache_file, zone_ids(5)).initialize()
+
+    def init(_):
+        make_app(stub, cache_file, zone_ids(5)).initialize()
+    report("initialize (warm cache)", measure(init, iterations))
+
+    def cold_setup():
+        path = os.path.join(tmp, f"cold_{perf_counter()}.json")
+        forecast.get_forecast_service(path, stub.url).batch_delay = 0
+        return make_app(stub, path, zone_ids(5))
+    report("initialize (cold cache)", measure(lambda app: app.initialize(), max(1, iterations // 10), cold_setup))
+
+    def first_plan(app):
+        app.initialize()
+        app.run_due_timers()
+    report("initialize + first plan (cold cache, stub fetch)", measure(first_plan, max(1, iterations // 10), cold_setup))
+
+    for count in zone_counts:
+        zones = zone_ids(count)
+        app = make_app(stub, cache_file, zones)
+        app.initialize()
+
+        report(f"schedule_energy_soak_run zones={count}", measure(lambda _: app.schedule_energy_soak_run(), iterations))
+
+        def cycle(_):
+            app.start_heat_soak()
+            app.run_due_timers()
+        report(f"start_heat_soak->stop_heat_soak zones={count}", measure(cycle, max(1, iterations // 10)))
+
+
+def bench_forecast(stub, iterations, hour_sizes, tmp):
+    service = forecast.get_forecast_service(os.path.join(tmp, "forecast_cache.json"), stub.url)
+    app = fakehass.FakeHass()
+    for hours in hour_sizes:
+        summary = forecast.ForecastSummary(app, LATITUDE, LONGITUDE, hours=hours, service=service)
+        report(f"ForecastSummary build hours={hours}", measure(
+            lambda _: forecast.ForecastSummary(app, LATITUDE, LONGITUDE, hours=hours, service=service), iterations))
+        report(f"warmest_hours(120) hours={hours}", measure(lambda _: summary.warmest_hours(120), iterations))
+        report(f"candidate_windows(120, top 3) hours={hours}", measure(lambda _: summary.candidate_windows(120), iterations))
+        report(f"summarize hours={hours}", measure(lambda _: summary.summarize(), iterations))
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--hours", default="48,168,384")
+    parser.add_argument("--zones", default="5,50,200")
+    args = parser.parse_args()
+
+    hour_sizes = [int(h) for h in args.hours.split(",")]
+    zone_counts = [int(z) for z in args.zones.split(",")]
+
+    with OpenMeteoStub() as stub, tempfile.TemporaryDirectory() as tmp:
+        bench_forecast(stub, args.iterations, hour_sizes, tmp)
+        bench_app(stub, args.iterations, zone_counts, tmp)
+        print(f"stub requests served: {stub.requests}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,112 @@
+"""
+End-to-end checks of the forecast fetch path against the local Open-Meteo stub:
+
+    python benchmarks/check_fetch.py
+
+- a 503 is retried and the forecast still arrives;
+- a slow response with an expired forecast in the cache serves the cached one straight
+  away and calls on_refresh once the fresh one lands;
+- a slow response with an empty cache returns an empty series straight away and calls
+  on_refresh once the first forecast lands;
+- without an on_refresh, an empty cache waits fetch_wait and then gives up.
+
+Exits non-zero on the first check that fails.
+"""
+from time import perf_counter
+import os
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "apps", "peakefficiency"))
+
+import fakehass
+fakehass.install()
+
+from openmeteo_stub import OpenMeteoStub, canned_forecast
+import forecast
+
+
+LATITUDE = 50.88
+LONGITUDE = -119.90
+TTL = 60 * 60
+
+
+def make_service(stub, tmp, name):
+    cache = forecast.ForecastCache(os.path.join(tmp, f"{name}.json"))
+    return forecast.ForecastService(cache, stub.url, batch_delay=0)
+
+
+def check(name, condition, detail=""):
+    print(f"{'ok  ' if condition else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not condition:
+        sys.exit(1)
+
+
+def check_retry(tmp):
+    with OpenMeteoStub(failures=1) as stub:
+        service = make_service(stub, tmp, "retry")
+        payload = service.refresh(fakehass.FakeHass(), LATITUDE, LONGITUDE).result(timeout=30)
+        check("503 is retried", payload is not None and stub.requests == 2, f"{stub.requests} requests")
+
+
+def check_stale_fallback(tmp):
+    with OpenMeteoStub(latency=2.0) as stub:
+        service = make_service(stub, tmp, "stale")
+        key = forecast.ForecastCache.make_key(LATITUDE, LONGITUDE, forecast.HOURLY_VARIABLES, forecast.DEFAULT_FORECAST_HOURS)
+        service.cache.put(key, canned_forecast(LATITUDE, forecast.DEFAULT_FORECAST_HOURS), now=time.time() - 2 * TTL)
+
+        refreshed = threading.Event()
+        started = perf_counter()
+        summary = forecast.ForecastSummary(fakehass.FakeHass(), LATITUDE, LONGITUDE, service=service, cache_ttl=TTL,
+                                           fetch_wait=5, on_refresh=refreshed.set)
+        elapsed = perf_counter() - started
+        check("expired forecast is served without waiting", summary.is_stale and len(summary.forecast_data) and elapsed < 1,
+              f"{elapsed * 1000:.0f} ms")
+        check("on_refresh fires when the slow fetch lands", refreshed.wait(timeout=30))
+        check("fresh forecast is cached", service.cache.get(key, TTL) is not None)
+
+
+def check_cold_start(tmp):
+    with OpenMeteoStub(latency=1.5) as stub:
+        service = make_service(stub, tmp, "cold")
+        key = forecast.ForecastCache.make_key(LATITUDE, LONGITUDE, forecast.HOURLY_VARIABLES, forecast.DEFAULT_FORECAST_HOURS)
+
+        refreshed = threading.Event()
+        started = perf_counter()
+        summary = forecast.ForecastSummary(fakehass.FakeHass(), LATITUDE, LONGITUDE, service=service, cache_ttl=TTL,
+                                           fetch_wait=5, on_refresh=refreshed.set)
+        elapsed = perf_counter() - started
+        check("cold start does not wait for the fetch", len(summary.forecast_data) == 0 and elapsed < 0.5,
+              f"{elapsed * 1000:.0f} ms")
+        check("on_refresh fires when the first forecast lands", refreshed.wait(timeout=30))
+        check("first forecast is cached", service.cache.get(key, TTL) is not None)
+
+
+def check_fetch_wait(tmp):
+    with OpenMeteoStub(latency=2.0) as stub:
+        service = make_service(stub, tmp, "empty")
+        started = perf_counter()
+        app = fakehass.FakeHass(keep_logs=True)
+        summary = forecast.ForecastSummary(app, LATITUDE, LONGITUDE, service=service, cache_ttl=TTL, fetch_wait=0.5)
+        elapsed = perf_counter() - started
+        check("empty cache gives up after fetch_wait", len(summary.forecast_data) == 0 and 0.5 <= elapsed < 1.5,
+              f"{elapsed * 1000:.0f} ms")
+        check("the timeout is logged", any("did not finish" in msg for _, msg in app.logs))
+        #let the slow fetch finish before the stub shuts down
+        service.refresh(app, LATITUDE, LONGITUDE).result(timeout=30)
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_retry(tmp)
+        check_stale_fallback(tmp)
+        check_cold_start(tmp)
+        check_fetch_wait(tmp)
+
+
+if __name__ == "__main__":
+    run()
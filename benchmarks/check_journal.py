@@ -0,0 +1,235 @@
+"""
+Checks of the run journal, and of resuming a soak run from it after a restart:
+
+    python benchmarks/check_journal.py
+
+- a run interrupted mid-way resumes with the same queue and running zones, and restores
+  each zone relative to when it actually started;
+- a helper-backed journal compacts itself when an append overflows, and still replays to
+  the live state; one that cannot hold even the snapshot stops writing without raising;
+- requeued zones replay to their new slots, including after restored zones have been
+  compacted out and the rest renumbered; a requeue the store cannot record changes nothing;
+- on resume, a queued zone removed from the config is dropped and a running one is
+  still restored.
+
+Exits non-zero on the first check that fails.
+"""
+from datetime import datetime
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "apps", "peakefficiency"))
+
+import fakehass
+fakehass.install()
+
+from journal import RunJournal, FileJournalStore, HelperJournalStore, JournalError
+from scheduler import SoakPlan, pack_zones
+from utils import StateMirror
+import main
+import registry
+
+
+ZONES = {"climate.zone_a": 10, "climate.zone_b": 20, "climate.zone_c": 30}  # minutes; heated one at a time, longest first
+START = datetime(2026, 1, 5, 9, 0)  # clear of the default 15:00 daily start
+HEAT_TO_TEMP = 19.5
+RESTORE_TEMP = 13.0
+
+
+def check(name, condition, detail=""):
+    print(f"{'ok  ' if condition else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+    if not condition:
+        sys.exit(1)
+
+
+def plan_state(plan):
+    if plan is None:
+        return None
+    return [(s.climate, s.offset, s.duration, s.started, s.started_at) for s in plan.zones]
+
+
+def replays(journal, store):
+    """
+    Whether a fresh journal reading the same store comes back to the live journal's state.
+    """
+    try:
+        return plan_state(RunJournal(store).load()) == plan_state(journal.plan)
+    except JournalError:
+        return False
+
+
+def make_app(directory, clock, zones=ZONES, states=None):
+    if states is None:
+        states = {z: {"state": "heat", "attributes": {"current_temperature": 15.0}} for z in zones}
+        states.update({
+            registry.AWAY_MODE_ENABLED: {"state": "on"},
+            registry.AWAY_TARGET_TEMP: {"state": str(RESTORE_TEMP)},
+            registry.AWAY_PEAK_HEAT_TO_TEMP: {"state": str(HEAT_TO_TEMP)},
+        })
+    os.makedirs(directory, exist_ok=True)
+    args = {
+        "zones": {z: {"duration": minutes} for z, minutes in zones.items()},
+        "journal_file": os.path.join(directory, "journal.log"),
+        "schedule_file": os.path.join(directory, "schedule.json"),
+        "soak_history_file": os.path.join(directory, "soaks.sqlite"),
+    }
+    app = main.PeakEfficiency(args=args, states=states, clock=clock)
+    app.initialize()
+    return app
+
+
+def restart(app, directory, zones=ZONES):
+    app.terminate()
+    return make_app(directory, app.clock, zones, states=app.states)
+
+
+def restored(*apps):
+    return [kwargs["entity_id"] for app in apps for service, kwargs in app.service_calls
+            if service == "climate/set_temperature" and kwargs["temperature"] == RESTORE_TEMP]
+
+
+def helper_store(max_length, count=2):
+    helpers = [f"input_text.journal_{i}" for i in range(count)]
+    app = fakehass.FakeHass(states={h: {"state": "", "attributes": {"max": max_length}} for h in helpers})
+    mirror = StateMirror(app, helpers)
+    mirror.load()
+    return lambda: HelperJournalStore(app, helpers, mirror)
+
+
+def check_replay(tmp):
+    directory = os.path.join(tmp, "replay")
+    clock = fakehass.VirtualClock(START)
+    app = make_app(directory, clock)
+    app.start_heat_soak()
+    #zone_c ran 0-30 minutes, zone_b runs 30-50, zone_a waits for 50-60
+    app.run_until(clock.ts + 35 * 60)
+    before = plan_state(app.soak_plan)
+
+    app = restart(app, directory)
+    check("restart resumes the same queue and running zones", plan_state(app.soak_plan) == before)
+    app.run_until(START.timestamp() + 49 * 60)
+    check("running zone is not restored early", "climate.zone_b" not in restored(app))
+    app.run_until(START.timestamp() + 51 * 60)
+    check("running zone is restored when its soak ends", restored(app) == ["climate.zone_b"])
+    app.run_until(START.timestamp() + 65 * 60)
+    check("queued zone runs after the restart", restored(app) == ["climate.zone_b", "climate.zone_a"])
+    check("the run is closed", app.soak_plan is None and RunJournal(app.journal.store).load() is None)
+    app.terminate()
+
+
+def check_compaction(tmp):
+    new_store = helper_store(max_length=100)
+    journal = RunJournal(new_store())
+    plain = RunJournal(FileJournalStore(os.path.join(tmp, "uncompacted.log")))
+    durations = {f"climate.zone_{i}": 600 for i in range(5)}
+    slots = pack_zones(durations)
+
+    consistent = True
+    for j in (journal, plain):
+        #each journal updates the slots of its plan in place, so each gets its own
+        j.begin(SoakPlan(started_at=1000, zones=pack_zones(durations)))
+    for slot in slots:
+        for j in (journal, plain):
+            j.started(slot.climate, 1000 + slot.offset, -5.0, 14.5)
+        consistent = consistent and replays(journal, new_store())
+        for j in (journal, plain):
+            j.finished(slot.climate, 1000 + slot.end, 19.5)
+        consistent = consistent and replays(journal, new_store())
+    uncompacted = os.path.getsize(plain.store.path)
+    check("the log outgrew the helpers", uncompacted > journal.store.capacity,
+          f"{uncompacted} characters, {journal.store.capacity} available")
+    check("every overflow compacted to a log that replays to the live state", consistent and not journal.full)
+    journal.close(1000 + slots[-1].end)
+    check("the closed run replays as closed", RunJournal(new_store()).load() is None)
+
+    big = {f"climate.zone_{i:03d}": 600 for i in range(20)}
+    try:
+        journal.begin(SoakPlan(started_at=1000, zones=pack_zones(big)))
+        raised = False
+    except JournalError:
+        raised = True
+    check("a plan the helpers cannot hold is reported", raised and journal.full)
+    try:
+        journal.started("climate.zone_000", 1000)
+        quiet = True
+    except JournalError:
+        quiet = False
+    check("later records are dropped without raising again", quiet and journal.plan.slot("climate.zone_000").started)
+
+
+class FailingStore(FileJournalStore):
+
+    fail = False
+
+    def reset(self, records):
+        if self.fail:
+            raise OSError("disk full")
+        super().reset(records)
+
+
+def check_requeue(tmp):
+    stores = {
+        "file": lambda: FileJournalStore(os.path.join(tmp, "requeue.log")),
+        "helper": helper_store(max_length=255),
+    }
+    for name, new_store in stores.items():
+        journal = RunJournal(new_store())
+        slots = pack_zones({"climate.zone_a": 600, "climate.zone_b": 600, "climate.zone_c": 600}, longest_first=False)
+        journal.begin(SoakPlan(started_at=1000, zones=slots))
+        journal.started("climate.zone_a", 1000, -5.0, 14.5)
+        journal.finished("climate.zone_a", 1600, 19.5)
+        journal.requeue({"climate.zone_b": (3600, 600), "climate.zone_c": (4200, 900)})
+        check(f"{name}: requeued zones replay to their new slots", replays(journal, new_store()))
+        journal.started("climate.zone_b", 4600, -4.0, 14.0)
+        journal.finished("climate.zone_b", 5200, 19.5)
+        journal.started("climate.zone_c", 5200, -4.0, 14.0)
+        check(f"{name}: records after the requeue name the right zones", replays(journal, new_store())
+              and journal.state("climate.zone_b") == "done" and journal.state("climate.zone_c") == "running")
+
+    store = FailingStore(os.path.join(tmp, "failing.log"))
+    journal = RunJournal(store)
+    journal.begin(SoakPlan(started_at=1000, zones=pack_zones({"climate.zone_a": 600, "climate.zone_b": 600})))
+    before = plan_state(journal.plan)
+    store.fail = True
+    try:
+        journal.requeue({"climate.zone_b": (3600, 600)})
+        raised = False
+    except OSError:
+        raised = True
+    store.fail = False
+    check("a requeue the store cannot record changes nothing", raised and plan_state(journal.plan) == before
+          and replays(journal, FileJournalStore(store.path)))
+
+
+def check_removed_zone(tmp):
+    directory = os.path.join(tmp, "removed")
+    clock = fakehass.VirtualClock(START)
+    app = make_app(directory, clock)
+    app.start_heat_soak()
+    app.run_until(clock.ts + 15 * 60)
+
+    #zone_c is heating and zone_a still queued when both are taken out of the config
+    app = restart(app, directory, zones={"climate.zone_b": 20})
+    check("a removed queued zone is dropped on resume", [s.climate for s in app.soak_plan.zones] == ["climate.zone_c", "climate.zone_b"])
+    check("the drop is journaled", RunJournal(app.journal.store).load().slot("climate.zone_a") is None)
+    app.run_until(START.timestamp() + 65 * 60)
+    check("a removed running zone is still restored", restored(app) == ["climate.zone_c", "climate.zone_b"])
+    heated = [kwargs["entity_id"] for service, kwargs in app.service_calls
+              if service == "climate/set_temperature" and kwargs["temperature"] == HEAT_TO_TEMP]
+    check("the removed queued zone never starts", "climate.zone_a" not in heated and app.soak_plan is None)
+    app.terminate()
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        check_replay(tmp)
+        check_compaction(tmp)
+        check_requeue(tmp)
+        check_removed_zone(tmp)
+
+
+if __name__ == "__main__":
+    run()
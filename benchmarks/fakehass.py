@@ -0,0 +1,238 @@
+"""
+In-process stand-in for the parts of the AppDaemon hass.Hass API the apps use:
+entity state, service calls, state/event listeners and timers. install() registers
+it as the hassapi module so apps can be imported without AppDaemon.
+
+With a VirtualClock, datetime()/get_now_ts() read the clock instead of the wall
+clock and run_until() fires timers in time order while moving the clock forward,
+so days of app time pass in milliseconds.
+"""
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import sys
+import types
+
+
+class VirtualClock:
+    """
+    Epoch seconds that only move when told to.
+    """
+
+    def __init__(self, start):
+        self.ts = start.timestamp()
+
+    def now(self):
+        return datetime.fromtimestamp(self.ts)
+
+    def advance_to(self, ts):
+        self.ts = max(self.ts, ts)
+
+
+class FakeHass:
+
+    def __init__(self, args=None, states=None, keep_logs=False, name="peak_efficiency", clock=None):
+        self.name = name
+        self.clock = clock
+        self.args = args or {}
+        self.states = {}  # entity_id -> {"state": ..., "attributes": {...}}
+        self.service_calls = []
+        self.logs = []
+        self.keep_logs = keep_logs
+        self.log_count = 0
+        self._ids = itertools.count(1)
+        self._state_listeners = {}  # handle -> (callback, entity_id, attribute, new, kwargs)
+        self._event_listeners = {}  # handle -> (callback, event, kwargs)
+        self._timers = []  # heap of (due, seq, handle)
+        self._timer_callbacks = {}  # handle -> (callback, kwargs, interval or None)
+        for entity_id, state in (states or {}).items():
+            self.set_state(entity_id, **state)
+
+    # logging
+
+    def log(self, msg, level="INFO"):
+        self.log_count += 1
+        if self.keep_logs:
+            self.logs.append((level, msg))
+
+    def error(self, msg, level="ERROR"):
+        self.log(msg, level)
+
+    # time
+
+    def datetime(self):
+        return self.clock.now() if self.clock else datetime.now()
+
+    # state
+
+    def get_state(self, entity_id=None, attribute=None):
+        if entity_id is None:
+            return {e: dict(s) for e, s in self.states.items()}
+        entry = self.states.get(entity_id)
+        if entry is None:
+            return None
+        if attribute == "all":
+            return dict(entry)
+        if attribute is not None:
+            return entry["attributes"].get(attribute)
+        return entry["state"]
+
+    def set_state(self, entity_id, state=None, attributes=None, **kwargs):
+        old = self.states.get(entity_id)
+        new = {
+            "state": state if state is not None or old is None else old["state"],
+            "attributes": {**(old["attributes"] if old else {}), **(attributes or {})},
+        }
+        self.states[entity_id] = new
+        self._notify(entity_id, old, new)
+        return new
+
+    def _notify(self, entity_id, old, new):
+        for callback, listen_entity, attribute, new_filter, kwargs in list(self._state_listeners.values()):
+            if listen_entity is not None and listen_entity != entity_id:
+                continue
+            if attribute == "all":
+                old_value, new_value = old, new
+            elif attribute is not None:
+                old_value = old["attributes"].get(attribute) if old else None
+                new_value = new["attributes"].get(attribute)
+            else:
+                old_value = old["state"] if old else None
+                new_value = new["state"]
+            if attribute != "all" and old_value == new_value:
+                continue
+            if new_filter is not None and new_value != new_filter:
+                continue
+            callback(entity_id, attribute, old_value, new_value, kwargs)
+
+    def listen_state(self, callback, entity_id=None, attribute=None, new=None, **kwargs):
+        handle = next(self._ids)
+        self._state_listeners[handle] = (callback, entity_id, attribute, new, kwargs)
+        return handle
+
+    def cancel_listen_state(self, handle):
+        self._state_listeners.pop(handle, None)
+
+    def listen_event(self, callback, event=None, **kwargs):
+        handle = next(self._ids)
+        self._event_listeners[handle] = (callback, event, kwargs)
+        return handle
+
+    def fire_event(self, event, **data):
+        for callback, listen_event, kwargs in list(self._event_listeners.values()):
+            if listen_event == event:
+                callback(event, data, kwargs)
+
+    # services
+
+    def call_service(self, service, **kwargs):
+        self.service_calls.append((service, kwargs))
+        entity_id = kwargs.get("entity_id")
+        if service == "input_text/set_value":
+            self.set_state(entity_id, state=kwargs["value"])
+        elif service == "climate/set_temperature":
+            self.set_state(entity_id, attributes={"temperature": kwargs["temperature"]})
+
+    # timers
+
+    def now_ts(self):
+        return self.clock.ts if self.clock else datetime.now().timestamp()
+
+    def get_now_ts(self):
+        return self.now_ts()
+
+    def _schedule(self, callback, due, kwargs, interval=None):
+        handle = next(self._ids)
+        self._timer_callbacks[handle] = (callback, kwargs, interval)
+        heapq.heappush(self._timers, (due, handle, handle))
+        return handle
+
+    def run_in(self, callback, delay, **kwargs):
+        return self._schedule(callback, self.now_ts() + delay, kwargs)
+
+    def run_at(self, callback, start, **kwargs):
+        return self._schedule(callback, start.timestamp(), kwargs)
+
+    def run_daily(self, callback, start, **kwargs):
+        due = datetime.combine(self.datetime().date(), start)
+        if due <= self.datetime():
+            due += timedelta(days=1)
+        return self._schedule(callback, due.timestamp(), kwargs, interval=24 * 60 * 60)
+
+    def run_every(self, callback, start, interval, **kwargs):
+        if isinstance(start, str):
+            #AppDaemon accepts "now" or "now+<seconds>"
+            offset = int(start.partition("+")[2] or 0)
+            due = self.now_ts() + offset
+        else:
+            due = start.timestamp()
+        return self._schedule(callback, due, kwargs, interval=interval)
+
+    def cancel_timer(self, handle):
+        self._timer_callbacks.pop(handle, None)
+
+    def timer_running(self, handle):
+        return handle in self._timer_callbacks
+
+    def pending_timers(self):
+        return len(self._timer_callbacks)
+
+    def run_due_timers(self, until=None, include_daily=False):
+        """
+        Fire timers in due order, ignoring wall-clock time, until none are left (or the next
+        is after until). Daily timers are skipped unless include_daily is set.
+        """
+        fired = 0
+        deferred = []
+        while self._timers:
+            due, seq, handle = heapq.heappop(self._timers)
+            if handle not in self._timer_callbacks:
+                continue
+            if until is not None and due > until:
+                heapq.heappush(self._timers, (due, seq, handle))
+                break
+            callback, kwargs, interval = self._timer_callbacks[handle]
+            if interval is not None and not include_daily:
+                deferred.append((due, seq, handle))
+                continue
+            if interval is None:
+                del self._timer_callbacks[handle]
+            else:
+                heapq.heappush(self._timers, (due + interval, seq, handle))
+            callback(kwargs)
+            fired += 1
+        for entry in deferred:
+            heapq.heappush(self._timers, entry)
+        return fired
+
+
+    def run_until(self, until):
+        """
+        Fire every timer due up to epoch seconds `until`, daily and repeating ones included,
+        with the clock set to each timer's due time; then leave the clock at `until`.
+        """
+        fired = 0
+        while self._timers and self._timers[0][0] <= until:
+            due, seq, handle = heapq.heappop(self._timers)
+            if handle not in self._timer_callbacks:
+                continue
+            callback, kwargs, interval = self._timer_callbacks[handle]
+            if interval is None:
+                del self._timer_callbacks[handle]
+            else:
+                heapq.heappush(self._timers, (due + interval, seq, handle))
+            self.clock.advance_to(due)
+            callback(kwargs)
+            fired += 1
+        self.clock.advance_to(until)
+        return fired
+
+
+def install(hass_class=FakeHass):
+    """
+    Make `import hassapi as hass` resolve to FakeHass, or a subclass of it.
+    """
+    module = types.ModuleType("hassapi")
+    module.Hass = hass_class
+    sys.modules["hassapi"] = module
+    return module
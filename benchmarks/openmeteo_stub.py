@@ -0,0 +1,91 @@
+"""
+Local HTTP server that answers Open-Meteo /v1/forecast requests with canned hourly data,
+including comma-separated multi-location requests.
+"""
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import json
+import math
+import threading
+import time
+
+
+def canned_forecast(lat, hours, start=None, utc_offset=0):
+    """
+    A smooth daily temperature cycle peaking mid-afternoon, with humidity and daytime radiation.
+    """
+    start = start or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    times, temps, humidity, radiation = [], [], [], []
+    for h in range(hours):
+        t = start + timedelta(hours=h)
+        phase = (t.hour - 9) / 24 * 2 * math.pi
+        times.append(t.strftime("%Y-%m-%dT%H:%M"))
+        temps.append(round(-5 + 8 * math.sin(phase) - abs(float(lat)) / 20 + (h // 24) * 0.3, 1))
+        humidity.append(round(70 - 20 * math.sin(phase)))
+        radiation.append(max(0, round(600 * math.sin((t.hour - 6) / 12 * math.pi))) if 6 <= t.hour <= 18 else 0)
+    return {
+        "utc_offset_seconds": utc_offset,
+        "hourly": {
+            "time": times,
+            "temperature_2m": temps,
+            "relative_humidity_2m": humidity,
+            "shortwave_radiation": radiation,
+        },
+    }
+
+
+class OpenMeteoStub:
+    """
+    Context manager running the stub on a free localhost port; url points at /v1/forecast.
+    latency adds a fixed delay per request; the first `failures` requests are answered
+    with 503; last_query holds the parsed query string of the most recent request.
+    """
+
+    def __init__(self, latency=0.0, failures=0):
+        self.latency = latency
+        self.failures = failures
+        self.requests = 0
+        self.last_query = None
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if stub.failures > 0:
+                    stub.failures -= 1
+                    self.send_error(503)
+                    return
+                query = parse_qs(urlparse(self.path).query)
+                lats = query["latitude"][0].split(",")
+                if "forecast_hours" in query:
+                    #forecast_hours counts from the current hour
+                    hours = int(query["forecast_hours"][0])
+                    start = datetime.now().replace(minute=0, second=0, microsecond=0)
+                else:
+                    hours = int(query.get("forecast_days", ["2"])[0]) * 24
+                    start = None
+                stub.last_query = query
+                results = [canned_forecast(lat, hours, start) for lat in lats]
+                body = json.dumps(results if len(results) > 1 else results[0]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/forecast"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,316 @@
+"""
+Time-warp simulation of the PeakEfficiency app. A virtual clock drives the app's own
+timers (schedule_energy_soak_run, start_heat_soak, process_next_zone, stop_heat_soak)
+through weeks of synthetic weather while simple thermostat physics heat and cool each
+zone, and every decision is written to a trace:
+
+    python benchmarks/simulate.py [--days 14] [--zones 5] [--start 2026-01-05] [--trace trace.jsonl]
+
+The trace is JSON lines: plan, start and restore events as they happen, and a day
+summary (heat delivered, electricity used, mean COP) at each midnight.
+"""
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from time import perf_counter
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "apps", "peakefficiency"))
+
+import fakehass
+
+
+LATITUDE = 50.88
+LONGITUDE = -119.90
+DEFAULT_STEP_MINUTES = 5  # physics resolution; timers still fire at their exact due time
+JOURNAL_HELPER = "input_text.peakefficiency_journal"  # with --helper-journal
+
+
+class SimHass(fakehass.FakeHass):
+    """
+    FakeHass that reports thermostat set-points to the simulation's trace.
+    """
+
+    def __init__(self, *args, sim=None, **kwargs):
+        self.sim = sim
+        super().__init__(*args, **kwargs)
+
+    def call_service(self, service, **kwargs):
+        super().call_service(service, **kwargs)
+        if service == "climate/set_temperature" and self.sim is not None:
+            self.sim.on_setpoint(kwargs["entity_id"], kwargs["temperature"])
+
+
+fakehass.install(SimHass)
+
+from optimizer import cop_curve
+import forecast
+import main
+import registry
+
+
+class SyntheticWeather:
+    """
+    Daily mean temperatures follow a mean-reverting random walk, so cold snaps last a
+    few days, with a diurnal swing peaking mid-afternoon. Forecasts are the truth plus
+    a bias that holds for the whole day they are issued on, and noise that grows with
+    lead time and is fixed per (issue hour, target hour).
+    """
+
+    def __init__(self, start, days, seed, mean=-5.0, swing=6.0, forecast_error=1.5, forecast_bias=2.0):
+        rnd = random.Random(seed)
+        self.start = start.timestamp()
+        self.seed = seed
+        self.swing = swing
+        self.forecast_error = forecast_error
+        self.forecast_bias = forecast_bias
+        self.day_means = []
+        value = mean
+        for _ in range(days + 4):
+            value += rnd.gauss(0, 2.0) + 0.3 * (mean - value)
+            self.day_means.append(value)
+
+    def temperature(self, ts):
+        days = (ts - self.start) / 86400
+        i = max(0, min(len(self.day_means) - 2, int(days)))
+        frac = days - i
+        daily = self.day_means[i] + (self.day_means[i + 1] - self.day_means[i]) * frac
+        local = datetime.fromtimestamp(ts)
+        hour = local.hour + local.minute / 60
+        return daily + self.swing * math.sin(2 * math.pi * (hour - 9) / 24)
+
+    def forecast(self, issued, hours):
+        """
+        An Open-Meteo style payload for the `hours` hours from the one containing `issued`.
+        """
+        first = int(issued // 3600) * 3600
+        bias = random.Random(hash((self.seed, datetime.fromtimestamp(first).toordinal()))).gauss(0, self.forecast_bias)
+        times, temps, humidity, radiation = [], [], [], []
+        for h in range(hours):
+            ts = first + h * 3600
+            rnd = random.Random(hash((self.seed, first, ts)))
+            local = datetime.fromtimestamp(ts)
+            times.append(local.strftime("%Y-%m-%dT%H:%M"))
+            temps.append(round(self.temperature(ts) + bias + rnd.gauss(0, self.forecast_error * (0.3 + h / 48)), 1))
+            humidity.append(70)
+            radiation.append(max(0, round(500 * math.sin((local.hour - 6) / 12 * math.pi))) if 6 <= local.hour <= 18 else 0)
+        offset = datetime.fromtimestamp(first).astimezone().utcoffset()
+        return {
+            "utc_offset_seconds": int(offset.total_seconds()) if offset else 0,
+            "hourly": {"time": times, "temperature_2m": temps,
+                       "relative_humidity_2m": humidity, "shortwave_radiation": radiation},
+        }
+
+
+class SimForecastService:
+    """
+    Stands in for forecast.ForecastService: every lookup is a fresh synthetic forecast
+    issued at the virtual time, so no request ever leaves the process.
+    """
+
+    max_age = math.inf
+
+    def __init__(self, weather, clock):
+        self.weather = weather
+        self.clock = clock
+        self.cache = self
+
+    def register(self, lat, lon, hours=forecast.DEFAULT_FORECAST_HOURS, ttl=forecast.DEFAULT_CACHE_TTL):
+        return forecast.ForecastCache.make_key(lat, lon, forecast.HOURLY_VARIABLES, hours)
+
+    def unregister(self, key):
+        pass
+
+    def get(self, key, ttl, now=None):
+        hours = int(key.rsplit("|", 1)[1])
+        return self.weather.forecast(self.clock.ts, hours)
+
+    def refresh(self, app, lat, lon, hours=forecast.DEFAULT_FORECAST_HOURS, ttl=forecast.DEFAULT_CACHE_TTL, metrics=None):
+        future = Future()
+        future.set_result(self.get(forecast.ForecastCache.make_key(lat, lon, forecast.HOURLY_VARIABLES, hours), ttl))
+        return future
+
+    def history(self, key, epoch):
+        return []
+
+
+@dataclass
+class ZonePhysics:
+    """
+    One room: the heat pump raises it at rate(outside) C/h while below its set-point
+    and it loses loss * (temp - outside) C/h to the outdoors.
+    """
+    climate: str
+    temp: float
+    base_rate: float  # C/h with 0C outside
+    rate_slope: float  # extra C/h per degree warmer outside
+    loss: float  # 1/h
+    heat_kw: float
+
+    def step(self, setpoint, outside, hours):
+        """
+        Advance the room; returns the heat delivered in kWh.
+        """
+        rate = max(0.0, self.base_rate + self.rate_slope * outside)
+        loss = self.loss * (self.temp - outside)
+        if self.temp < setpoint - 0.01:
+            duty = 1.0
+            self.temp = min(setpoint, self.temp + (rate - loss) * hours)
+        elif self.temp > setpoint + 0.01:
+            duty = 0.0
+            self.temp = max(setpoint, self.temp - loss * hours)
+        else:
+            #the thermostat holds the set-point, running just enough to cover the loss
+            duty = min(1.0, max(0.0, loss / rate)) if rate > 0 else 1.0
+        return self.heat_kw * duty * hours
+
+
+class Simulation:
+
+    def __init__(self, start, days, zone_count, seed, step_minutes, tmp, max_concurrent=2, helper_journal=False):
+        self.start = datetime.combine(start, datetime.min.time())
+        self.end = self.start + timedelta(days=days)
+        self.step = step_minutes * 60
+        self.clock = fakehass.VirtualClock(self.start)
+        self.weather = SyntheticWeather(self.start, days, seed)
+        self.cop = cop_curve()
+        self.trace = []
+        self.day = None
+        self._reset_day()
+
+        rnd = random.Random(seed)
+        zones = [f"climate.zone_{i:03d}" for i in range(zone_count)]
+        self.zones = {z: ZonePhysics(z, temp=13.0, base_rate=rnd.uniform(3.5, 5.0), rate_slope=rnd.uniform(0.05, 0.12),
+                                     loss=rnd.uniform(0.03, 0.08), heat_kw=rnd.uniform(0.8, 1.5)) for z in zones}
+
+        states = {z: {"state": "heat", "attributes": {"current_temperature": 13.0, "temperature": 13.0}} for z in zones}
+        states.update({
+            JOURNAL_HELPER: {"state": "", "attributes": {"max": 255}},
+            registry.MANUAL_START: {"state": "off"},
+            registry.AWAY_MODE_ENABLED: {"state": "on"},
+            registry.PEAK_EFFICIENCY_DISABLED: {"state": "off"},
+            registry.DRY_RUN: {"state": "off"},
+            registry.OUTDOOR_TEMPERATURE_SENSOR: {"state": str(round(self.weather.temperature(self.clock.ts), 1))},
+            registry.AWAY_TARGET_TEMP: {"state": "13"},
+            registry.AWAY_PEAK_HEAT_TO_TEMP: {"state": "19.5"},
+        })
+        args = {
+            "latitude": LATITUDE,
+            "longitude": LONGITUDE,
+            "max_concurrent_zones": max_concurrent,
+            "zones": {z: {"duration": 10 + 10 * (i % 4)} for i, z in enumerate(zones)},
+            "schedule_file": os.path.join(tmp, "schedule.json"),
+            "soak_history_file": os.path.join(tmp, "soaks.sqlite"),
+            "publish_metrics": False,
+        }
+
+        if helper_journal:
+            args["journal_helpers"] = [JOURNAL_HELPER]
+        else:
+            args["journal_file"] = os.path.join(tmp, "journal.log")
+
+        #the app builds its forecast service in initialize(); hand it the synthetic one
+        service = SimForecastService(self.weather, self.clock)
+        main.get_forecast_service = lambda *a, **k: service
+        self.app = main.PeakEfficiency(args=args, states=states, clock=self.clock, sim=self)
+        self._schedule = None
+
+    def run(self):
+        self.app.initialize()
+        while self.clock.ts < self.end.timestamp():
+            now = self.clock.ts
+            self.app.run_until(now + self.step)
+            self._trace_plan()
+            self._physics(now, self.step / 3600)
+            if datetime.fromtimestamp(self.clock.ts).date() != self.day["date"]:
+                self._close_day()
+        self.app.terminate()
+        return self.trace
+
+    def on_setpoint(self, climate, temperature):
+        zone = self.zones.get(climate)
+        if zone is None:
+            return
+        event = "start" if temperature >= self.app.heat_to_temp else "restore"
+        if event == "start":
+            self.day["soaks"] += 1
+        self._emit(event, zone=climate, setpoint=temperature, zone_temp=round(zone.temp, 2),
+                   outside=round(self.weather.temperature(self.clock.ts), 1))
+
+    def _physics(self, since, hours):
+        outside = self.weather.temperature(since)
+        cop = self.cop(outside)
+        for climate, zone in self.zones.items():
+            setpoint = self.app.get_state(climate, attribute="temperature")
+            heat = zone.step(setpoint, outside, hours)
+            self.day["heat_kwh"] += heat
+            self.day["electric_kwh"] += heat / cop
+            self.app.set_state(climate, attributes={"current_temperature": round(zone.temp, 1)})
+        self.day["min_outside"] = min(self.day["min_outside"], outside)
+        self.app.set_state(registry.OUTDOOR_TEMPERATURE_SENSOR, state=str(round(self.weather.temperature(self.clock.ts), 1)))
+
+    def _trace_plan(self):
+        schedule = self.app.daily_schedule
+        if schedule is not None and schedule is not self._schedule:
+            self._schedule = schedule
+            self._emit("plan", run_at=schedule.run_at.isoformat(), zones=len(schedule.zones))
+
+    def _close_day(self):
+        day = self.day
+        self._emit("day", date=day["date"].isoformat(), soaks=day["soaks"], heat_kwh=round(day["heat_kwh"], 3),
+                   electric_kwh=round(day["electric_kwh"], 3),
+                   cop=round(day["heat_kwh"] / day["electric_kwh"], 3) if day["electric_kwh"] else None,
+                   min_outside=round(day["min_outside"], 1))
+        self._reset_day()
+
+    def _reset_day(self):
+        self.day = {"date": datetime.fromtimestamp(self.clock.ts).date(), "soaks": 0, "heat_kwh": 0.0,
+                    "electric_kwh": 0.0, "min_outside": math.inf}
+
+    def _emit(self, event, **fields):
+        self.trace.append({"t": datetime.fromtimestamp(self.clock.ts).isoformat(timespec="seconds"), "event": event, **fields})
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--zones", type=int, default=5)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2026, 1, 5))
+    parser.add_argument("--step", type=int, default=DEFAULT_STEP_MINUTES, help="physics step in minutes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace", help="write the decision trace here as JSON lines")
+    parser.add_argument("--helper-journal", action="store_true", help="keep the run journal in an input_text helper")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = perf_counter()
+        sim = Simulation(args.start, args.days, args.zones, args.seed, args.step, tmp, helper_journal=args.helper_journal)
+        trace = sim.run()
+        elapsed = perf_counter() - started
+
+    if args.trace:
+        with open(args.trace, "w") as f:
+            for entry in trace:
+                f.write(json.dumps(entry) + "\n")
+
+    run_at = "-"
+    for e in trace:
+        if e["event"] == "plan":
+            run_at = e["run_at"]
+        elif e["event"] == "day":
+            print(f"{e['date']}  run at {run_at:<8}  soaks={e['soaks']:<3} heat={e['heat_kwh']:7.2f} kWh  "
+                  f"electric={e['electric_kwh']:7.2f} kWh  COP={e['cop'] or 0:4.2f}  min outside={e['min_outside']:6.1f}C")
+    days = [e for e in trace if e["event"] == "day"]
+    print(f"simulated {len(days)} days, {len(trace)} trace events in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    run()